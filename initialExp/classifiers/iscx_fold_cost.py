@@ -0,0 +1,71 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import resource
+import time
+
+__author__ = "Jarrod N. Bakker"
+
+"""Contains functions for measuring the cost of running a classifier
+on a fold.
+"""
+
+# Headings of the cost columns of a results file, in the order returned
+# by cost_columns().
+COST_HEADINGS = ["fit_time", "predict_time", "flows_per_sec",
+                 "train_size", "cpu_time"]
+
+
+def timed(func, *args):
+    """Call a function and measure how long it took.
+
+    :param func: Function to call.
+    :param args: Arguments to call the function with.
+    :return: Tuple of what the function returned, the wall time and the
+    CPU time it took in seconds.
+    """
+    cpu_start = _cpu_time()
+    start = time.time()
+    result = func(*args)
+    return result, time.time()-start, _cpu_time()-cpu_start
+
+
+def cost_columns(fit_time, predict_time, cpu_time, train_size, test_size):
+    """Return the cost columns of a fold.
+
+    :param fit_time: Wall time taken to train the classifier in seconds.
+    :param predict_time: Wall time taken to classify the testing set in
+    seconds.
+    :param cpu_time: CPU time taken to train the classifier and classify
+    the testing set in seconds.
+    :param train_size: Number of flows in the training set.
+    :param test_size: Number of flows in the testing set.
+    :return: List of the fit time, predict time, flows classified per
+    second, training set size and CPU time.
+    """
+    flows_per_sec = 0.0
+    if predict_time > 0:
+        flows_per_sec = test_size/predict_time
+    return [fit_time, predict_time, flows_per_sec, train_size, cpu_time]
+
+
+def _cpu_time():
+    """Return the CPU time used by this process, summed over its
+    threads.
+
+    :return: User and system time in seconds.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
@@ -0,0 +1,69 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from iscx_fold_view import FoldView
+import iscx_fold_cost as fc
+import iscx_result_calc as rc
+import profiling
+
+__author__ = "Jarrod N. Bakker"
+
+"""Contains the loop that runs a classifier over the folds of a trial.
+"""
+
+
+def run_folds(cls_name, description, fit, predict, data, labels, skf):
+    """Run a classifier over the folds of a trial.
+
+    :param cls_name: Name of the classifier, used to label its profiles.
+    :param description: Name of the classifier to print while training.
+    :param fit: Function that trains the classifier, taking the training
+    data and labels.
+    :param predict: Function that classifies data with the trained
+    classifier.
+    :param data: Data set for the classifier to use.
+    :param labels: Labels indicating if a flow is normal or attack.
+    :param skf: StratifiedKFold object representing what data set
+    elements belong in each fold.
+    :return: List of the results of each fold.
+    """
+    all_results = []  # Results from all fold trials
+    fold_num = 1
+    fold_view = FoldView(data, labels)
+    for train, test in skf:
+        with profiling.profile("classify", fold_num, classifier=cls_name):
+            print("\tTraining {0}...".format(description))
+            # NOTE: I have switched the training and testing set around.
+            train_array, train_label_array = fold_view.gather(
+                test, FoldView.TRAIN)
+            fit_time, fit_cpu = fc.timed(fit, train_array,
+                                         train_label_array)[1:]
+            print("\tTesting classifier...")
+            test_array, test_label_array = fold_view.gather(
+                train, FoldView.TEST)
+            test_size = len(train)  # Remember the switch of sets!
+            pred, predict_time, predict_cpu = fc.timed(predict, test_array)
+            tp, tn, fp, fn = rc.calculate_tpn_fpn(test_label_array, pred)
+            mislabeled = fp + fn
+            detection_rate = rc.detection_rate(tp, fn)
+            false_pos_rate = rc.false_positive_rate(tn, fp)
+            all_results.append([fold_num, tp, tn, fp, fn, detection_rate,
+                                false_pos_rate, mislabeled, test_size] +
+                               fc.cost_columns(fit_time, predict_time,
+                                               fit_cpu+predict_cpu,
+                                               len(train_label_array),
+                                               test_size))
+        fold_num += 1
+    return all_results
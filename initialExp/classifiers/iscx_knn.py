@@ -12,12 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from numpy import float32 as np_float
-
-import numpy.core.multiarray as np_array
 from sklearn.neighbors import KNeighborsClassifier
 
-import iscx_result_calc as rc
+import iscx_fold_runner as fold_runner
 
 __author__ = "Jarrod N. Bakker"
 
@@ -47,28 +44,7 @@ class KNNCls:
 
         :return: Results of the classification.
         """
-        all_results = []  # Results from all fold trials
-        fold_num = 1
-        for train, test in self._kfold:
-            print("\tTraining K-Nearest Neighbours...")
-            # NOTE: I have switched the training and testing set around.
-            train_array = np_array.array(map(self._data.__getitem__,
-                                             test)).astype(np_float)
-            train_label_array = np_array.array(map(
-                self._labels.__getitem__, test)).astype(np_float)
-            self._classifier.fit(train_array, train_label_array)
-            print("\tTesting classifier...")
-            test_array = np_array.array(map(self._data.__getitem__,
-                                             train)).astype(np_float)
-            test_label_array = np_array.array(map(
-                self._labels.__getitem__, train)).astype(np_float)
-            test_size = len(train)  # Remember the switch of sets!
-            pred = self._classifier.predict(test_array)
-            mislabeled = (test_label_array != pred).sum()
-            tp, tn, fp, fn = rc.calculate_tpn_fpn(test_label_array, pred)
-            detection_rate = rc.detection_rate(tp, fn)
-            false_pos_rate = rc.false_positive_rate(tn, fp)
-            all_results.append([fold_num, tp, tn, fp, fn, detection_rate,
-                                false_pos_rate, mislabeled, test_size])
-            fold_num += 1
-        return all_results
+        return fold_runner.run_folds(self.NAME, "K-Nearest Neighbours",
+                                     self._classifier.fit,
+                                     self._classifier.predict, self._data,
+                                     self._labels, self._kfold)
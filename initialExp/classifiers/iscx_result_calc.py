@@ -14,12 +14,22 @@
 
 from data.iscx_ids_2012 import TagValue
 
+import numpy as np
+
 __author__ = "Jarrod N. Bakker"
 
 """Contains functions for interpreting the test output for the ISCX
 IDS 2012 dataset.
+
+The confusion matrix of a fold is counted in one pass with a bincount
+over a code for each flow, made from whether its label and its
+prediction are normal.
 """
 
+# Confusion matrix cell of each code: label is attack * 2 + prediction
+# is attack.
+_TN, _FP, _FN, _TP = range(4)
+
 
 def calculate_tpn_fpn(test_labels, pred):
     """Calculate TP, TN, FP and FN.
@@ -31,23 +41,7 @@ def calculate_tpn_fpn(test_labels, pred):
     :param pred: Predicted labels for the test set.
     :return: TP, TN, FP, FN as integers in a tuple.
     """
-    tp = 0
-    tn = 0
-    fp = 0
-    fn = 0
-    norm = TagValue.Normal
-    for i in range(test_labels.size):
-        if test_labels[i] == norm:
-            if pred[i] == norm:
-                tn += 1
-            else:
-                fp += 1
-        else:
-            if pred[i] == norm:
-                fn += 1
-            else:
-                tp += 1
-    return tp, tn, fp, fn
+    return confusion_counts(test_labels, pred)
 
 
 def calculate_tpn_fpn_anom(test_labels, pred):
@@ -64,24 +58,7 @@ def calculate_tpn_fpn_anom(test_labels, pred):
     :param pred: Predicted labels for the test set.
     :return: TP, TN, FP, FN as integers in a tuple.
     """
-    tp = 0
-    tn = 0
-    fp = 0
-    fn = 0
-
-    norm = 1  # an inlier
-    for i in range(test_labels.size):
-        if test_labels[i] == norm:
-            if pred[i] == norm:
-                tn += 1
-            else:
-                fp += 1
-        else:
-            if pred[i] == norm:
-                fn += 1
-            else:
-                tp += 1
-    return tp, tn, fp, fn
+    return confusion_counts(test_labels, pred, normal=1)  # 1 is an inlier
 
 
 def detection_rate(tp, fn):
@@ -106,3 +83,31 @@ def false_positive_rate(tn, fp):
     if (fp+tn) == 0:
         return 0
     return fp/float(fp+tn)
+
+
+def confusion_counts(test_labels, pred, normal=TagValue.Normal):
+    """Count TP, TN, FP and FN in one pass.
+
+    :param test_labels: Actual labels for the test set.
+    :param pred: Predicted labels for the test set.
+    :param normal: Label of normal flows. Any other label is an attack.
+    :return: TP, TN, FP, FN as integers in a tuple.
+    """
+    counts = np.bincount(_confusion_codes(test_labels, pred, normal),
+                         minlength=4)
+    return (int(counts[_TP]), int(counts[_TN]), int(counts[_FP]),
+            int(counts[_FN]))
+
+
+def _confusion_codes(test_labels, pred, normal):
+    """Return the confusion matrix code of each flow.
+
+    :param test_labels: Actual labels for the test set.
+    :param pred: Predicted labels for the test set.
+    :param normal: Label of normal flows.
+    :return: Array of codes.
+    """
+    codes = np.not_equal(test_labels, normal).astype(np.intp)
+    codes <<= 1
+    codes += np.not_equal(pred, normal)
+    return codes
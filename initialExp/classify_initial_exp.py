@@ -23,7 +23,10 @@ from classifiers.iscx_decisiontree import DecisionTreeCls
 from classifiers.iscx_random_forest import RandomForestCls
 from classifiers.iscx_knn import KNNCls
 from data.iscx_ids_2012 import ISCX2012IDS
+import profiling
+from multiprocessing import cpu_count
 from os.path import isfile
+import argparse
 import datetime
 import sys
 
@@ -40,7 +43,10 @@ class Classify:
         :param dataset_files: List of dataset file names.
         """
         self._dataset_files = dataset_files
-        self._iscx2012_loader = ISCX2012IDS(dataset_files)
+        self._iscx2012_loader = ISCX2012IDS(dataset_files,
+                                            streaming=True,
+                                            cache=True,
+                                            workers=cpu_count())
 
     def run_tests(self):
         """Test a bunch of classifiers.
@@ -51,17 +57,39 @@ class Classify:
 
         csv_headings = "classifier, features, seed, trial_num, " \
                        "fold_num, TP, TN, FP, FN, TP_rate, FP_rate, " \
-                       "num_mis, total_test\n"
+                       "num_mis, total_test, fit_time, predict_time, " \
+                       "flows_per_sec, train_size, cpu_time\n"
         classifiers = [NaiveBayesCls, SVMCls, LDACls, QDACls,
                        DecisionTreeCls, RandomForestCls, KNNCls]
         num_trials = 10
         num_folds = 30
 
-        if not self._iscx2012_loader.load_data():
+        # Rows are only appended to results files with the same columns.
+        for cls in classifiers:
+            file_name = "{0}_{1}-fold_results.csv".format(cls.NAME,
+                                                         num_folds)
+            if isfile(file_name):
+                with open(file_name, mode="r") as f_results:
+                    first_line = f_results.readline()
+                if first_line != csv_headings:
+                    print("ERROR: Results file {0} was written with "
+                          "different columns or in an older format. Move "
+                          "it aside to start a new one.".format(file_name))
+                    sys.exit(-1)
+
+        with profiling.profile("load"):
+            loaded = self._iscx2012_loader.load_data()
+        if not loaded:
             print("Failed to read data from file.")
             sys.exit(-1)
 
         features_set, labels = self._iscx2012_loader.get_data()
+        seeds = [99999999+i for i in range(num_trials)]
+        fold_plan = self._iscx2012_loader.get_fold_plan(
+            num_folds, seeds, "{0}-fold_plan.npz".format(num_folds))
+        # Each feature set is freed once every classifier has used it.
+        for fs in features_set.values():
+            fs.acquire(len(classifiers))
 
         with open("test_time.txt", mode="a") as file_out:
             cur_dt = str(datetime.datetime.now())
@@ -84,7 +112,6 @@ class Classify:
             for cls in classifiers:
                 print("Testing features [{0}] with {1}.".format(
                     features, cls))
-                seed = 99999999
                 file_name = "{0}_{1}-fold_results.csv".format(
                     cls.NAME, num_folds)
                 # If the results file does not exist we should create
@@ -94,11 +121,12 @@ class Classify:
                     with open(file_name, mode="w") as new_file:
                         new_file.write(csv_headings)
                 for trial_num in range(1, num_trials+1):
-                    skf = self._iscx2012_loader.get_kfold(num_folds,
-                                                          seed)
+                    seed = fold_plan.get_seed(trial_num-1)
+                    skf = fold_plan.get_folds(trial_num-1)
+                    profiling.set_labels(features=features, trial=trial_num)
                     # create the classifier, pass the data through
                     # call classify
-                    results = cls(features_set[features],
+                    results = cls(features_set[features].get(),
                                   labels, skf).classify()
                     print("\tWriting results for trial {0}.".format(
                         trial_num))
@@ -123,7 +151,7 @@ class Classify:
                             err_out.write("{0}\t\tIOError writing "
                                           "results to file: "
                                           "{1}\n".format(cur_dt, err))
-                    seed += 1
+                features_set[features].release()
 
         with open("test_time.txt", mode="a") as file_out:
             cur_dt = str(datetime.datetime.now())
@@ -132,6 +160,23 @@ class Classify:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Test classifiers on the ISCX 2012 IDS data set.")
+    parser.add_argument("--profile", metavar="UNIT[,UNIT]",
+                        help="profile units of the run with cProfile: "
+                             "{0}".format(", ".join(profiling.UNITS)))
+    parser.add_argument("--profile-every", metavar="N", type=int, default=1,
+                        help="only profile every Nth fold (default: 1)")
+    parser.add_argument("--profile-dir", metavar="DIR", default="profiles",
+                        help="directory to write the pstats and collapsed "
+                             "stack files to (default: profiles)")
+    args = parser.parse_args()
+    if args.profile is not None:
+        try:
+            profiling.enable(args.profile_dir, args.profile.split(","),
+                             args.profile_every)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
     files = ["TestbedTueJun15-1Flows.xml",
              "TestbedTueJun15-2Flows.xml",
              "TestbedTueJun15-3Flows.xml"]
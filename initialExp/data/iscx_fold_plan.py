@@ -0,0 +1,197 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+
+import numpy as np
+
+__author__ = "Jarrod N. Bakker"
+
+
+class FoldPlan:
+    """The folds of every trial in a run.
+
+    The folds are held as an int8 matrix of fold IDs with one row per
+    trial and one column per flow. The train and test indices of each
+    fold are taken from this matrix when they are needed rather than
+    regenerating the StratifiedKFold of the trial.
+    """
+
+    FOLD_DTYPE = np.int8
+
+    def __init__(self, fold_ids, seeds, num_folds, labels_hash):
+        """Initialise.
+
+        :param fold_ids: int8 matrix of the fold of each flow in each
+        trial.
+        :param seeds: List of the seed used to shuffle each trial.
+        :param num_folds: The number of folds in each trial.
+        :param labels_hash: Hash of the labels the folds were formed
+        from.
+        """
+        self._fold_ids = fold_ids
+        self._seeds = list(seeds)
+        self._num_folds = num_folds
+        self._labels_hash = labels_hash
+
+    @staticmethod
+    def build(get_kfold, labels, num_folds, seeds):
+        """Work out the folds of every trial.
+
+        :param get_kfold: Callable taking the number of folds and a
+        seed and returning the StratifiedKFold for them.
+        :param labels: Array of the label of each flow.
+        :param num_folds: The number of folds in each trial.
+        :param seeds: List of the seed used to shuffle each trial.
+        :return: FoldPlan object.
+        """
+        if num_folds > np.iinfo(FoldPlan.FOLD_DTYPE).max:
+            raise ValueError("Too many folds for a fold plan: "
+                             "{0}".format(num_folds))
+        fold_ids = np.empty((len(seeds), len(labels)),
+                            dtype=FoldPlan.FOLD_DTYPE)
+        for trial in range(len(seeds)):
+            skf = get_kfold(num_folds, seeds[trial])
+            fold = 0
+            for train, test in skf:
+                fold_ids[trial, test] = fold
+                fold += 1
+        return FoldPlan(fold_ids, seeds, num_folds, _hash_labels(labels))
+
+    @staticmethod
+    def load(file_name):
+        """Load a fold plan saved by save().
+
+        :param file_name: Name of the .npz file.
+        :return: FoldPlan object.
+        """
+        with np.load(file_name) as saved:
+            return FoldPlan(saved["fold_ids"], saved["seeds"].tolist(),
+                            int(saved["num_folds"]),
+                            str(saved["labels_hash"]))
+
+    def save(self, file_name):
+        """Save the fold plan so that it can be reused.
+
+        :param file_name: Name of the .npz file.
+        """
+        np.savez(file_name, fold_ids=self._fold_ids,
+                 seeds=np.array(self._seeds, dtype=np.int64),
+                 num_folds=self._num_folds, labels_hash=self._labels_hash)
+
+    def matches(self, labels, num_folds, seeds):
+        """Return whether the plan is for the given run.
+
+        :param labels: Array of the label of each flow.
+        :param num_folds: The number of folds in each trial.
+        :param seeds: List of the seed used to shuffle each trial.
+        :return: True if it is, False otherwise.
+        """
+        return self._num_folds == num_folds and \
+            self._seeds == list(seeds) and \
+            self._labels_hash == _hash_labels(labels)
+
+    def get_fold_ids(self):
+        """Return the matrix of fold IDs.
+
+        :return: int8 matrix with one row per trial.
+        """
+        return self._fold_ids
+
+    def get_labels_hash(self):
+        """Return the hash of the labels the folds were formed from.
+
+        :return: Hash as a hex string.
+        """
+        return self._labels_hash
+
+    def get_num_folds(self):
+        """Return the number of folds in each trial.
+
+        :return: Number as an integer.
+        """
+        return self._num_folds
+
+    def get_num_trials(self):
+        """Return the number of trials.
+
+        :return: Number as an integer.
+        """
+        return len(self._seeds)
+
+    def get_seed(self, trial):
+        """Return the seed used to shuffle a trial.
+
+        :param trial: Index of the trial.
+        :return: The seed.
+        """
+        return self._seeds[trial]
+
+    def get_folds(self, trial):
+        """Return the folds of a trial.
+
+        :param trial: Index of the trial.
+        :return: TrialFolds object.
+        """
+        return TrialFolds(self._fold_ids[trial], self._num_folds)
+
+
+class TrialFolds:
+    """The folds of a single trial.
+
+    Iterating gives the train and test indices of each fold in the
+    same form and order as a StratifiedKFold object does.
+    """
+
+    def __init__(self, fold_ids, num_folds):
+        """Initialise.
+
+        :param fold_ids: int8 array of the fold of each flow.
+        :param num_folds: The number of folds.
+        """
+        self._fold_ids = fold_ids
+        self._num_folds = num_folds
+
+    def __len__(self):
+        """Return the number of folds.
+
+        :return: Number as an integer.
+        """
+        return self._num_folds
+
+    def __iter__(self):
+        """Iterate over the folds.
+
+        :return: Generator of train and test index arrays.
+        """
+        for fold in range(self._num_folds):
+            yield self.get_fold(fold)
+
+    def get_fold(self, fold):
+        """Return the train and test indices of a fold.
+
+        :param fold: Index of the fold.
+        :return: Sorted arrays of the train and test indices.
+        """
+        in_fold = self._fold_ids == fold
+        return np.flatnonzero(~in_fold), np.flatnonzero(in_fold)
+
+
+def _hash_labels(labels):
+    """Return a hash of the labels of a data set.
+
+    :param labels: Array of the label of each flow.
+    :return: Hash as a hex string.
+    """
+    return hashlib.sha1(np.ascontiguousarray(labels).tobytes()).hexdigest()
@@ -12,8 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from datetime import datetime
-import math
+import iscx_feature_engine as engine
 
 __author__ = "Jarrod N. Bakker"
 
@@ -21,144 +20,84 @@ __author__ = "Jarrod N. Bakker"
 """This file contains functions to produce different feature sets.
 """
 
+# Raw flow fields read by the functions below. Nothing else needs to
+# be kept when the data set is loaded.
+FEATURE_FIELDS = ["totalSourceBytes", "totalSourcePackets",
+                  "totalDestinationBytes", "totalDestinationPackets",
+                  "startDateTime", "stopDateTime"]
+
 
 def src_bytes_dst_bytes(data):
     """Return the totalSourceBytes and totalDestinationBytes.
 
-    :param data: The data set to manipulate.
-    :return: List of the transformed features.
+    :param data: FlowTable of the data set to manipulate.
+    :return: float32 matrix of the transformed features.
     """
     print("\tTotal Source Bytes, Total Destination Bytes")
-    features = ["totalSourceBytes", "totalDestinationBytes"]
-    return _return_features(data, features)
+    return engine.feature_matrix([
+        engine.column(data, "totalSourceBytes"),
+        engine.column(data, "totalDestinationBytes")])
 
 
 def src_bytes_src_pckts(data):
     """Return the totalSourceBytes and totalSourcePackets.
 
-    :param data: The data set to manipulate.
-    :return: List of the transformed features.
+    :param data: FlowTable of the data set to manipulate.
+    :return: float32 matrix of the transformed features.
     """
     print("\tTotal Source Bytes, Total Source Packets")
-    features = ["totalSourceBytes", "totalSourcePackets"]
-    return _return_features(data, features)
+    return engine.feature_matrix([
+        engine.column(data, "totalSourceBytes"),
+        engine.column(data, "totalSourcePackets")])
 
 
 def src_bpp_dst_bpp(data):
     """Return the source bytes per packet and destination bytes per
     packet.
 
-    :param data: The data set to manipulate.
-    :return: List of the transformed features.
+    :param data: FlowTable of the data set to manipulate.
+    :return: float32 matrix of the transformed features.
     """
     print("\tSource Bytes per Packet, Destination Bytes per Packet")
-    features = ["totalSourceBytes", "totalSourcePackets",
-                "totalDestinationBytes", "totalDestinationPackets"]
-    selected_data = _return_features(data, features)
-    transf_data = []
-    for flow in selected_data:
-        new_entry = []
-        src_bp_ratio = 0
-        try:
-            src_bp_ratio = float(flow[0])/float(flow[1])
-        except ZeroDivisionError:
-            pass
-        new_entry.append(src_bp_ratio)
-        dst_bp_ratio = 0
-        try:
-            dst_bp_ratio = float(flow[2])/float(flow[3])
-        except ZeroDivisionError:
-            pass
-        new_entry.append(dst_bp_ratio)
-        transf_data.append(new_entry)
-    return transf_data
+    return engine.feature_matrix([
+        engine.safe_ratio(engine.column(data, "totalSourceBytes"),
+                          engine.column(data, "totalSourcePackets")),
+        engine.safe_ratio(engine.column(data, "totalDestinationBytes"),
+                          engine.column(data,
+                                        "totalDestinationPackets"))])
 
 
 def src_bytes_flow_duration(data):
     """Return the source bytes and flow duration.
 
-    :param data: The data set to manipulate.
-    :return: List of the transformed features.
+    :param data: FlowTable of the data set to manipulate.
+    :return: float32 matrix of the transformed features.
     """
     print("\tSource Bytes, Flow Duration")
-    features = ["totalSourceBytes", "startDateTime", "stopDateTime"]
-    selected_data = _return_features(data, features)
-    transf_data = []
-    for flow in selected_data:
-        new_entry = []
-        src_bytes = float(flow[0])
-        new_entry.append(src_bytes)
-        start_dt = datetime.strptime(flow[1], "%Y-%m-%dT%H:%M:%S")
-        stop_dt = datetime.strptime(flow[2], "%Y-%m-%dT%H:%M:%S")
-        duration = (stop_dt-start_dt).seconds
-        new_entry.append(duration)
-        transf_data.append(new_entry)
-    return transf_data
+    return engine.feature_matrix([
+        engine.column(data, "totalSourceBytes"),
+        engine.flow_duration(data)])
 
 
 def log_src_bytes_flow_duration(data):
     """Return the log(source bytes) and flow duration.
 
-    :param data: The data set to manipulate.
-    :return: List of the transformed features.
+    :param data: FlowTable of the data set to manipulate.
+    :return: float32 matrix of the transformed features.
     """
     print("\tlog(Source Bytes), Flow Duration")
-    features = ["totalSourceBytes", "startDateTime", "stopDateTime"]
-    selected_data = _return_features(data, features)
-    transf_data = []
-    for flow in selected_data:
-        new_entry = []
-        src_bytes = 0
-        try:
-            src_bytes = math.log(float(flow[0]))
-        except ValueError:
-            pass
-        new_entry.append(src_bytes)
-        start_dt = datetime.strptime(flow[1], "%Y-%m-%dT%H:%M:%S")
-        stop_dt = datetime.strptime(flow[2], "%Y-%m-%dT%H:%M:%S")
-        duration = (stop_dt-start_dt).seconds
-        new_entry.append(duration)
-        transf_data.append(new_entry)
-    return transf_data
+    return engine.feature_matrix([
+        engine.safe_log(engine.column(data, "totalSourceBytes")),
+        engine.flow_duration(data)])
 
 
 def src_bytes_log_flow_duration(data):
     """Return the log(source bytes) and flow duration.
 
-    :param data: The data set to manipulate.
-    :return: List of the transformed features.
+    :param data: FlowTable of the data set to manipulate.
+    :return: float32 matrix of the transformed features.
     """
     print("\tSource Bytes, log(Flow Duration)")
-    features = ["totalSourceBytes", "startDateTime", "stopDateTime"]
-    selected_data = _return_features(data, features)
-    transf_data = []
-    for flow in selected_data:
-        new_entry = []
-        src_bytes = float(flow[0])
-        new_entry.append(src_bytes)
-        start_dt = datetime.strptime(flow[1], "%Y-%m-%dT%H:%M:%S")
-        stop_dt = datetime.strptime(flow[2], "%Y-%m-%dT%H:%M:%S")
-        duration = 0
-        try:
-            duration = math.log((stop_dt-start_dt).seconds)
-        except ValueError:
-            pass
-        new_entry.append(duration)
-        transf_data.append(new_entry)
-    return transf_data
-
-
-def _return_features(data, features):
-    """Select specific raw features from the data
-
-    :param data: The data set to manipulate.
-    :param features: A list of ISXC 2012 IDS specific features.
-    :return: List of data with just the chosen features.
-    """
-    processed_data = []
-    for flow in data:
-        new_entry = []
-        for f in features:
-            new_entry.append(flow[f])
-        processed_data.append(new_entry)
-    return processed_data
+    return engine.feature_matrix([
+        engine.column(data, "totalSourceBytes"),
+        engine.safe_log(engine.flow_duration(data))])
@@ -0,0 +1,319 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Profile chosen units of a run with cProfile.
+
+A unit is either loading the data set ("load") or one classifier on
+one fold ("classify"). Each profiled unit is written to a directory as
+a pstats file, which can be read with the pstats module or tools such
+as snakeviz, and as collapsed stacks, which flamegraph tools such as
+flamegraph.pl or speedscope can read. Folds can be sampled so that only
+every Nth fold is profiled, to keep the overhead of a long run low.
+
+Usage: python profiling.py PSTATS_FILE COLLAPSED_FILE
+"""
+
+import cProfile
+import os
+import pstats
+import re
+import sys
+
+__author__ = "Jarrod N. Bakker"
+
+
+# Units that can be profiled.
+UNITS = ("load", "classify")
+
+
+class Profiler:
+    """Profiles the chosen units of a process and writes them out.
+    """
+
+    def __init__(self, out_dir, units, every=1):
+        """Initialise.
+
+        :param out_dir: Directory to write the profiles to. It is
+        created if it does not exist.
+        :param units: List of the names of the units to profile.
+        :param every: Only profile every Nth fold, starting from the
+        first.
+        """
+        unknown = set(units) - set(UNITS)
+        if unknown:
+            raise ValueError("Unknown units to profile: {0}".format(
+                ", ".join(sorted(unknown))))
+        if every < 1:
+            raise ValueError("Folds to profile must be sampled at least "
+                             "every 1 fold: {0}".format(every))
+        self._out_dir = out_dir
+        self._units = list(units)
+        self._every = every
+        self._labels = {}
+        self._active = False
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+    def get_config(self):
+        """Return the arguments to create the same profiler with, such
+        as in a worker process.
+
+        :return: Tuple of the directory, the units and the sampling.
+        """
+        return self._out_dir, self._units, self._every
+
+    def set_labels(self, **labels):
+        """Set labels to name the profiles of the following units with.
+
+        :param labels: Labels, such as the feature set and trial being
+        run. A label of None is removed.
+        """
+        for key, value in labels.items():
+            if value is None:
+                self._labels.pop(key, None)
+            else:
+                self._labels[key] = value
+
+    def profile(self, unit, fold_num=None, **labels):
+        """Return a context manager that profiles a unit if it is
+        chosen.
+
+        :param unit: Name of the unit.
+        :param fold_num: Number of the fold the unit runs on, None if it
+        does not run on a fold.
+        :param labels: Labels to name the profile with, added to those
+        given to set_labels().
+        :return: Context manager.
+        """
+        if unit not in self._units or self._active:
+            # cProfile cannot profile a unit inside another one.
+            return _NO_PROFILE
+        if fold_num is not None and (fold_num-1) % self._every != 0:
+            return _NO_PROFILE
+        all_labels = dict(self._labels)
+        all_labels.update(labels)
+        if fold_num is not None:
+            all_labels["fold"] = fold_num
+        return _Profile(self, unit, all_labels)
+
+    def _write(self, profile, unit, labels):
+        """Write a profile out.
+
+        :param profile: cProfile.Profile of the unit.
+        :param unit: Name of the unit.
+        :param labels: Dict of the labels to name the profile with.
+        """
+        parts = [unit]
+        for key in sorted(labels):
+            if isinstance(labels[key], (int, long)):
+                parts.append("{0}{1}".format(key, labels[key]))
+            else:
+                parts.append(_slug(labels[key]))
+        base = os.path.join(self._out_dir, "-".join(parts))
+        stats = pstats.Stats(profile)
+        stats.dump_stats(base + ".pstats")
+        write_collapsed(stats, base + ".collapsed")
+
+
+class _Profile:
+    """A unit being profiled by a Profiler.
+    """
+
+    def __init__(self, profiler, unit, labels):
+        """Initialise.
+
+        :param profiler: Profiler to write the profile out with.
+        :param unit: Name of the unit.
+        :param labels: Dict of the labels to name the profile with.
+        """
+        self._profiler = profiler
+        self._unit = unit
+        self._labels = labels
+        self._profile = None
+
+    def __enter__(self):
+        self._profiler._active = True
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self._profile.disable()
+        self._profiler._active = False
+        try:
+            self._profiler._write(self._profile, self._unit, self._labels)
+        except (IOError, OSError) as err:
+            print("Unable to write the profile of {0}: {1}".format(
+                self._unit, err))
+        return False
+
+
+class _NoProfile:
+    """A unit that is not profiled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+
+_NO_PROFILE = _NoProfile()
+_profiler = None
+
+
+def enable(out_dir, units, every=1):
+    """Start profiling units of this process.
+
+    :param out_dir: Directory to write the profiles to.
+    :param units: List of the names of the units to profile.
+    :param every: Only profile every Nth fold.
+    """
+    global _profiler
+    _profiler = Profiler(out_dir, units, every)
+
+
+def disable():
+    """Stop profiling units of this process.
+    """
+    global _profiler
+    _profiler = None
+
+
+def get_config():
+    """Return the arguments this process profiles with.
+
+    :return: Tuple of the directory, the units and the sampling, or None
+    if profiling is not enabled.
+    """
+    if _profiler is None:
+        return None
+    return _profiler.get_config()
+
+
+def set_labels(**labels):
+    """Set labels to name the profiles of the following units with.
+
+    :param labels: Labels, such as the feature set and trial being run.
+    A label of None is removed.
+    """
+    if _profiler is not None:
+        _profiler.set_labels(**labels)
+
+
+def profile(unit, fold_num=None, **labels):
+    """Return a context manager that profiles a unit if it is chosen.
+
+    :param unit: Name of the unit.
+    :param fold_num: Number of the fold the unit runs on, None if it
+    does not run on a fold.
+    :param labels: Labels to name the profile with.
+    :return: Context manager.
+    """
+    if _profiler is None:
+        return _NO_PROFILE
+    return _profiler.profile(unit, fold_num, **labels)
+
+
+def collapse_stats(stats, min_usec=1):
+    """Turn profile statistics into collapsed stacks.
+
+    cProfile only records which function called which, not whole
+    stacks, so the stacks are rebuilt by walking down from the
+    functions that have no caller. The time of a function called from
+    several places is shared between them in proportion to the time
+    spent under each caller. Recursive calls are folded into the first
+    frame of the function.
+
+    :param stats: pstats.Stats object.
+    :param min_usec: Leave out stacks under this many microseconds.
+    :return: Dict of the time spent in each stack in microseconds,
+    keyed by the frames of the stack from the root joined by ";".
+    """
+    raw = stats.stats
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in raw.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(func)
+    stacks = {}
+    roots = [func for func in raw if not raw[func][4]]
+
+    def walk(func, path, in_path, share):
+        tt, ct = raw[func][2], raw[func][3]
+        if ct * share * 1e6 < min_usec:
+            return
+        path = path + [_frame(func)]
+        key = ";".join(path)
+        stacks[key] = stacks.get(key, 0.0) + tt * share * 1e6
+        in_path = in_path | set([func])
+        for callee in callees.get(func, []):
+            if callee in in_path or raw[callee][3] <= 0:
+                continue
+            # Time the callee spent under this function, as a share of
+            # all of its time.
+            edge_ct = raw[callee][4][func][3]
+            walk(callee, path, in_path, share * edge_ct / raw[callee][3])
+
+    for root in roots:
+        walk(root, [], set(), 1.0)
+    return dict([(key, int(round(usec))) for key, usec in stacks.items()
+                 if int(round(usec)) >= min_usec])
+
+
+def write_collapsed(stats, file_name):
+    """Write profile statistics as collapsed stacks, one stack and its
+    time in microseconds per line.
+
+    :param stats: pstats.Stats object.
+    :param file_name: Name of the file to write.
+    """
+    stacks = collapse_stats(stats)
+    with open(file_name, mode="w") as f_out:
+        for key in sorted(stacks):
+            f_out.write("{0} {1}\n".format(key, stacks[key]))
+
+
+def _frame(func):
+    """Return the name of a function as a frame of a collapsed stack.
+
+    :param func: Tuple of the file name, line number and function name
+    as used by pstats.
+    :return: Frame name as a string.
+    """
+    file_name, line, name = func
+    if file_name == "~":
+        frame = name  # A built-in function
+    else:
+        frame = "{0} ({1}:{2})".format(name, os.path.basename(file_name),
+                                       line)
+    return frame.replace(";", ":")
+
+
+def _slug(value):
+    """Return a value made safe to use in a file name.
+
+    :param value: Value of a label.
+    :return: String of letters, digits, "_", "." and "-".
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", str(value)).strip("_")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python profiling.py PSTATS_FILE COLLAPSED_FILE")
+        sys.exit(-1)
+    write_collapsed(pstats.Stats(sys.argv[1]), sys.argv[2])
+    print("Wrote the collapsed stacks to: {0}".format(sys.argv[2]))
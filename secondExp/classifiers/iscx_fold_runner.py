@@ -0,0 +1,117 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from iscx_fold_view import FoldView
+import iscx_fold_cost as fc
+import iscx_result_calc as rc
+import profiling
+import tracing
+
+__author__ = "Jarrod N. Bakker"
+
+"""Contains functions for running classifiers over the folds of a
+trial.
+
+The arrays of each fold are gathered once and handed to every
+classifier, so running several classifiers over the same folds does
+not rebuild the arrays for each of them.
+"""
+
+
+def run_folds(classifiers, data, labels, skf):
+    """Run classifiers over the folds of a trial.
+
+    :param classifiers: List of classifier objects with a
+    classify_fold() method.
+    :param data: Data set for the classifiers to use.
+    :param labels: Labels indicating if a flow is normal or attack.
+    :param skf: StratifiedKFold object representing what data set
+    elements belong in each fold.
+    :return: List of the results of each classifier, in the same order
+    as classifiers.
+    """
+    fold_view = FoldView(data, labels)
+    all_results = [[] for cls in classifiers]  # Results of each fold
+    fold_num = 1
+    for train, test in skf:
+        fold = gather_fold(fold_view, train, test)
+        for i in range(len(classifiers)):
+            with tracing.span("classify", classifier=classifiers[i].NAME,
+                              fold=fold_num), \
+                    profiling.profile("classify", fold_num,
+                                      classifier=classifiers[i].NAME):
+                all_results[i].append(classifiers[i].classify_fold(
+                    fold_num, *fold))
+        fold_num += 1
+    return all_results
+
+
+def gather_fold(fold_view, train, test):
+    """Gather the arrays of a fold.
+
+    :param fold_view: FoldView of the data set.
+    :param train: Array of the indices of the training set.
+    :param test: Array of the indices of the testing set.
+    :return: Tuple of the training data, training labels, testing data
+    and testing labels.
+    """
+    with tracing.span("gather", train=len(test),
+                      test=len(train)) as span:
+        # NOTE: I have switched the training and testing set around.
+        train_array, train_label_array = fold_view.gather(test,
+                                                          FoldView.TRAIN)
+        test_array, test_label_array = fold_view.gather(train,
+                                                        FoldView.TEST)
+        span.set(bytes_per_flow=tracing.bytes_per_flow(
+            train_array.nbytes + test_array.nbytes,
+            len(train_array) + len(test_array)))
+    return train_array, train_label_array, test_array, test_label_array
+
+
+def evaluate_fold(classifier, fold_num, train_array, train_label_array,
+                  test_array, test_label_array):
+    """Train a classifier on a fold and test it.
+
+    :param classifier: sklearn classifier object.
+    :param fold_num: Number of the fold.
+    :param train_array: Data to train the classifier with.
+    :param train_label_array: Labels of the training data.
+    :param test_array: Data to test the classifier with.
+    :param test_label_array: Labels of the testing data.
+    :return: Results of the fold as a list, with the memory columns
+    on the end if the memory of the run is traced.
+    """
+    with tracing.span("fit", flows=len(train_label_array)) as fit_span:
+        fit_time, fit_cpu = fc.timed(classifier.fit, train_array,
+                                     train_label_array)[1:]
+    print("\tTesting classifier...")
+    test_size = len(test_label_array)
+    with tracing.span("predict", flows=test_size) as predict_span:
+        pred, predict_time, predict_cpu = fc.timed(classifier.predict,
+                                                   test_array)
+    with tracing.span("metrics"):
+        tp, tn, fp, fn = rc.calculate_tpn_fpn(test_label_array, pred)
+        mislabeled = fp + fn
+        detection_rate = rc.detection_rate(tp, fn)
+        false_pos_rate = rc.false_positive_rate(tn, fp)
+    costs = fc.cost_columns(fit_time, predict_time, fit_cpu+predict_cpu,
+                            len(train_label_array), test_size)
+    if tracing.is_tracing_memory():
+        costs += fc.memory_columns(fit_span.get_memory(),
+                                   predict_span.get_memory(),
+                                   train_array.nbytes,
+                                   len(train_label_array), test_array.nbytes,
+                                   test_size)
+    return [fold_num, tp, tn, fp, fn, detection_rate, false_pos_rate,
+            mislabeled, test_size] + costs
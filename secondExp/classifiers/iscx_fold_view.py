@@ -0,0 +1,73 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+__author__ = "Jarrod N. Bakker"
+
+
+class FoldView:
+    """Serves the rows and labels of the folds of a data set.
+
+    The data set is turned into a C-contiguous float32 matrix once.
+    The rows of a fold are then gathered with np.take() into buffers
+    that are reused from fold to fold, instead of rebuilding the arrays
+    from Python lists and casting them for every fold.
+
+    There is one buffer per slot (TRAIN and TEST), so the arrays
+    returned for a slot are only valid until that slot is gathered
+    into again.
+    """
+
+    DTYPE = np.float32
+    TRAIN = 0
+    TEST = 1
+
+    def __init__(self, data, labels):
+        """Initialise.
+
+        :param data: Data set with one row per flow. It is not copied if
+        it is already a C-contiguous float32 matrix.
+        :param labels: Labels indicating if a flow is normal or attack.
+        They are not copied if they are already a C-contiguous float32
+        array.
+        """
+        self._data = np.ascontiguousarray(data, dtype=self.DTYPE)
+        if self._data.ndim == 1:
+            self._data = self._data.reshape(-1, 1)
+        self._labels = np.ascontiguousarray(labels, dtype=self.DTYPE)
+        self._buffers = [None, None]
+
+    def gather(self, indices, slot):
+        """Gather the rows and labels of a fold.
+
+        :param indices: Array of the data set indices in the fold.
+        :param slot: FoldView.TRAIN or FoldView.TEST.
+        :return: float32 matrix of the rows and float32 array of the
+        labels.
+        """
+        num_rows = len(indices)
+        buf = self._buffers[slot]
+        if buf is None or len(buf[1]) < num_rows:
+            buf = (np.empty((num_rows, self._data.shape[1]),
+                            dtype=self.DTYPE),
+                   np.empty(num_rows, dtype=self.DTYPE))
+            self._buffers[slot] = buf
+        rows = buf[0][:num_rows]
+        labels = buf[1][:num_rows]
+        # The indices come from the folds so they are always in range.
+        # Clipping lets np.take() write straight into the buffers.
+        np.take(self._data, indices, axis=0, out=rows, mode="clip")
+        np.take(self._labels, indices, out=labels, mode="clip")
+        return rows, labels
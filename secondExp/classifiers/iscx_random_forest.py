@@ -12,12 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from numpy import float32 as np_float
-
-import numpy.core.multiarray as np_array
 from sklearn.ensemble import RandomForestClassifier
 
-import iscx_result_calc as rc
+import iscx_fold_runner as fold_runner
 
 __author__ = "Jarrod N. Bakker"
 
@@ -26,7 +23,7 @@ class RandomForestCls:
 
     NAME = "Random_Forest"
 
-    def __init__(self, config, data, labels, skf):
+    def __init__(self, config, data=None, labels=None, skf=None):
         """Initialise.
 
         :param config: Dict of config information for classifiers.
@@ -39,6 +36,21 @@ class RandomForestCls:
         self._data = data
         self._labels = labels
         self._kfold = skf
+        self._classifier = RandomForestClassifier(
+            n_estimators=self._config["n_estimators"],
+            criterion=self._config["criterion"],
+            max_depth=self._config["max_depth"],
+            min_samples_split=self._config["min_samples_split"],
+            min_samples_leaf=self._config["min_samples_leaf"],
+            min_weight_fraction_leaf=self._config["min_weight_fraction_leaf"],
+            max_features=self._config["max_features"],
+            max_leaf_nodes=self._config["max_leaf_nodes"],
+            bootstrap=self._config["bootstrap"],
+            oob_score=self._config["oob_score"], n_jobs=self._config["n_jobs"],
+            random_state=self._config["random_state"],
+            verbose=self._config["verbose"],
+            warm_start=self._config["warm_start"],
+            class_weight=self._config["class_weight"])
 
     def classify(self):
         """Classify DDoS flows using a Random Forest.
@@ -48,52 +60,21 @@ class RandomForestCls:
 
         :return: Results of the classification.
         """
-        classifier = RandomForestClassifier(n_estimators=self._config[
-            "n_estimators"], criterion=self._config["criterion"],
-                                            max_depth=self._config[
-                                                "max_depth"],
-                                            min_samples_split=self._config["min_samples_split"],
-                                            min_samples_leaf=self._config["min_samples_leaf"],
-                                            min_weight_fraction_leaf=self._config["min_weight_fraction_leaf"],
-                                            max_features=self._config[
-                                                "max_features"],
-                                            max_leaf_nodes=self._config["max_leaf_nodes"],
-                                            bootstrap=self._config[
-                                                "bootstrap"],
-                                            oob_score=self._config[
-                                                "oob_score"],
-                                            n_jobs=self._config[
-                                                "n_jobs"],
-                                            random_state=self._config[
-                                                "random_state"],
-                                            verbose=self._config[
-                                                "verbose"],
-                                            warm_start=self._config[
-                                                "warm_start"],
-                                            class_weight=self._config[
-                                                "class_weight"])
-        all_results = []  # Results from all fold trials
-        fold_num = 1
-        for train, test in self._kfold:
-            print("\tTraining Random Forest...")
-            # NOTE: I have switched the training and testing set around.
-            train_array = np_array.array(map(self._data.__getitem__,
-                                             test)).astype(np_float)
-            train_label_array = np_array.array(map(
-                self._labels.__getitem__, test)).astype(np_float)
-            classifier.fit(train_array, train_label_array)
-            print("\tTesting classifier...")
-            test_array = np_array.array(map(self._data.__getitem__,
-                                             train)).astype(np_float)
-            test_label_array = np_array.array(map(
-                self._labels.__getitem__, train)).astype(np_float)
-            test_size = len(train)  # Remember the switch of sets!
-            pred = classifier.predict(test_array)
-            mislabeled = (test_label_array != pred).sum()
-            tp, tn, fp, fn = rc.calculate_tpn_fpn(test_label_array, pred)
-            detection_rate = rc.detection_rate(tp, fn)
-            false_pos_rate = rc.false_positive_rate(tn, fp)
-            all_results.append([fold_num, tp, tn, fp, fn, detection_rate,
-                                false_pos_rate, mislabeled, test_size])
-            fold_num += 1
-        return all_results
+        return fold_runner.run_folds([self], self._data, self._labels,
+                                     self._kfold)[0]
+
+    def classify_fold(self, fold_num, train_array, train_label_array,
+                      test_array, test_label_array):
+        """Train and test the classifier on a single fold.
+
+        :param fold_num: Number of the fold.
+        :param train_array: Data to train the classifier with.
+        :param train_label_array: Labels of the training data.
+        :param test_array: Data to test the classifier with.
+        :param test_label_array: Labels of the testing data.
+        :return: Results of the fold.
+        """
+        print("\tTraining Random Forest...")
+        return fold_runner.evaluate_fold(self._classifier, fold_num,
+                                         train_array, train_label_array,
+                                         test_array, test_label_array)
@@ -12,12 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from numpy import float32 as np_float
 from sklearn import svm
 
-import numpy.core.multiarray as np_array
-
-import iscx_result_calc as rc
+import iscx_fold_runner as fold_runner
 
 __author__ = "Jarrod N. Bakker"
 
@@ -26,7 +23,7 @@ class SVMCls:
 
     NAME = "SVM_RBF"
 
-    def __init__(self, config, data, labels, skf):
+    def __init__(self, config, data=None, labels=None, skf=None):
         """Initialise.
 
         :param config: Dict of config information for classifiers.
@@ -39,6 +36,16 @@ class SVMCls:
         self._data = data
         self._labels = labels
         self._kfold = skf
+        self._classifier = svm.SVC(
+            C=self._config["C"], kernel=self._config["kernel"],
+            degree=self._config["degree"], gamma=self._config["gamma"],
+            coef0=self._config["coef0"], shrinking=self._config["shrinking"],
+            probability=self._config["probability"], tol=self._config["tol"],
+            cache_size=self._config["cache_size"],
+            class_weight=self._config["class_weight"],
+            verbose=self._config["verbose"], max_iter=self._config["max_iter"],
+            decision_function_shape=self._config["decision_function_shape"],
+            random_state=self._config["random_state"])
 
     def classify(self):
         """Classify DDoS flows using a Support Vector Machine.
@@ -54,43 +61,21 @@ class SVMCls:
 
         :return: Results of the classification.
         """
-        classifier = svm.SVC(C=self._config["C"], kernel=self._config[
-            "kernel"], degree=self._config["degree"],
-                             gamma=self._config["gamma"],
-                             coef0=self._config["coef0"],
-                             shrinking=self._config["shrinking"],
-                             probability=self._config["probability"],
-                             tol=self._config["tol"],
-                             cache_size=self._config["cache_size"],
-                             class_weight=self._config[
-                                 "class_weight"],
-                             verbose=self._config["verbose"],
-                             max_iter=self._config["max_iter"],
-                             decision_function_shape=self._config[
-                                 "decision_function_shape"],
-                             random_state=self._config["random_state"])
-        all_results = []  # Results from all fold trials
-        fold_num = 1
-        for train, test in self._kfold:
-            print("\tTraining SVM...")
-            # NOTE: I have switched the training and testing set around.
-            train_array = np_array.array(map(self._data.__getitem__,
-                                             test)).astype(np_float)
-            train_label_array = np_array.array(map(
-                self._labels.__getitem__, test)).astype(np_float)
-            classifier.fit(train_array, train_label_array)
-            print("\tTesting classifier...")
-            test_array = np_array.array(map(self._data.__getitem__,
-                                             train)).astype(np_float)
-            test_label_array = np_array.array(map(
-                self._labels.__getitem__, train)).astype(np_float)
-            test_size = len(train)  # Remember the switch of sets!
-            pred = classifier.predict(test_array)
-            mislabeled = (test_label_array != pred).sum()
-            tp, tn, fp, fn = rc.calculate_tpn_fpn(test_label_array, pred)
-            detection_rate = rc.detection_rate(tp, fn)
-            false_pos_rate = rc.false_positive_rate(tn, fp)
-            all_results.append([fold_num, tp, tn, fp, fn, detection_rate,
-                                false_pos_rate, mislabeled, test_size])
-            fold_num += 1
-        return all_results
+        return fold_runner.run_folds([self], self._data, self._labels,
+                                     self._kfold)[0]
+
+    def classify_fold(self, fold_num, train_array, train_label_array,
+                      test_array, test_label_array):
+        """Train and test the classifier on a single fold.
+
+        :param fold_num: Number of the fold.
+        :param train_array: Data to train the classifier with.
+        :param train_label_array: Labels of the training data.
+        :param test_array: Data to test the classifier with.
+        :param test_label_array: Labels of the testing data.
+        :return: Results of the fold.
+        """
+        print("\tTraining SVM...")
+        return fold_runner.evaluate_fold(self._classifier, fold_num,
+                                         train_array, train_label_array,
+                                         test_array, test_label_array)
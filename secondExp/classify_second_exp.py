@@ -16,15 +16,27 @@
 """
 
 from config_loader import ConfigLoader
+import classifiers.iscx_fold_cost as fc
 from classifiers.iscx_knn import KNNCls
 from classifiers.iscx_naive_bayes import NaiveBayesCls
 from classifiers.iscx_qda import QDACls
 from classifiers.iscx_random_forest import RandomForestCls
 from classifiers.iscx_svm_rbf import SVMCls
 from data.iscx_ids_2012 import ISCX2012IDS
+from experiment_scheduler import ExperimentScheduler, SerialOrder
+from grid_execution import GridCoordinator, GridWorker, parse_address
+import profiling
+from results_sink import ResultsSink
+from results_store import ResultsStore
+from run_manifest import RunManifest
+import tracing
 
+from multiprocessing import cpu_count
 from os import path
+import argparse
 import datetime
+import os
+import stat
 import sys
 
 __author__ = "Jarrod N. Bakker"
@@ -34,44 +46,98 @@ class Classify:
     """Main class.
     """
 
+    _CLASSIFIERS = [KNNCls, NaiveBayesCls, QDACls, RandomForestCls,
+                    SVMCls]
     _CONFIG_DIR = "config"
+    _FOLD_PLAN = "{0}-fold_plan.npz"
+    _GRID_AUTHKEY_ENV = "ISCX_GRID_AUTHKEY"
+    _MANIFEST = "{0}-fold_manifest.jsonl"
+    _MIN_AUTHKEY_LEN = 16
+    _RESULTS_STORE = "{0}-fold_results.sqlite"
+    _TASK_COSTS = "task_costs.json"
     _TEST_DEBUG = "test_time.txt"
     _WORKING_DIR = path.dirname(__file__)
 
-    def __init__(self, config_file_name, dataset_files):
+    def __init__(self, config_file_name, dataset_files,
+                 experiment_file_name=None):
         """Initialise the program.
 
         :param config_file_name: Name of the config file.
         :param dataset_files: List of dataset file names.
+        :param experiment_file_name: Name of the experiment config
+        file, if there is one.
         """
         self._config_file_path = path.join(self._WORKING_DIR,
                                            self._CONFIG_DIR,
                                            config_file_name)
-        self._config_loader = ConfigLoader(self._config_file_path)
+        experiment_file_path = None
+        if experiment_file_name is not None:
+            experiment_file_path = path.join(self._WORKING_DIR,
+                                             self._CONFIG_DIR,
+                                             experiment_file_name)
+        self._config_loader = ConfigLoader(self._config_file_path,
+                                           experiment_file_path)
         self._config_loader.read_config()
+        exp_config = self._config_loader.get_experiment_config()
         self._dataset_files = dataset_files
-        self._iscx2012_loader = ISCX2012IDS(dataset_files)
+        # Run every classifier on each fold in turn instead of running
+        # each classifier over all of the folds in turn.
+        self._fold_major = exp_config.get("fold_major", False)
+        # Number of processes to run the tests in, None for one per CPU.
+        self._workers = exp_config.get("workers", 1)
+        if self._workers is None:
+            self._workers = cpu_count()
+        # File holding the key shared by the coordinator and workers of
+        # a multi-host run.
+        self._grid_authkey_file = exp_config.get("grid_authkey_file")
+        self._results_config = exp_config.get("results", {})
+        # JSON lines file to trace the phases of a run to, None to not
+        # trace them.
+        self._trace_file = exp_config.get("trace_file")
+        # Record the memory of each phase, and of fitting and predicting
+        # in the results rows.
+        self._trace_memory = exp_config.get("trace_memory", False)
+        self._iscx2012_loader = ISCX2012IDS(
+            dataset_files, streaming=True, cache=True,
+            workers=cpu_count(),
+            feature_sets=exp_config.get("feature_sets"))
 
-    def run_tests(self):
+    def run_tests(self, coordinator_address=None):
         """Test a bunch of classifiers.
+
+        :param coordinator_address: Tuple of the host and port to serve
+        the tests to workers on, None to run them on this host.
         """
         with open(self._TEST_DEBUG, mode="a") as f_debug:
             cur_dt = str(datetime.datetime.now())
             f_debug.write("{0}\tTest started\n".format(cur_dt))
+        if self._trace_file is not None or self._trace_memory:
+            tracing.enable(self._trace_file, truncate=True,
+                           memory=self._trace_memory)
 
-        csv_headings = "classifier, features, seed, trial_num, " \
-                       "fold_num, TP, TN, FP, FN, TP_rate, FP_rate, " \
-                       "num_mis, total_test\n"
-        classifiers = [KNNCls, NaiveBayesCls, QDACls, RandomForestCls,
-                       SVMCls]
+        csv_headings = ["classifier", "features", "seed", "trial_num",
+                        "fold_num", "TP", "TN", "FP", "FN", "TP_rate",
+                        "FP_rate", "num_mis", "total_test"]
+        csv_headings += fc.COST_HEADINGS
+        if self._trace_memory:
+            csv_headings += fc.MEMORY_HEADINGS
+        classifiers = self._CLASSIFIERS
         num_trials = 10
         num_folds = 30
 
-        if not self._iscx2012_loader.load_data():
+        with profiling.profile("load"):
+            loaded = self._iscx2012_loader.load_data()
+        if not loaded:
             print("Failed to read data from file.")
             sys.exit(-1)
 
         features_set, labels = self._iscx2012_loader.get_data()
+        seeds = [99999999+i for i in range(num_trials)]
+        fold_plan = self._iscx2012_loader.get_fold_plan(
+            num_folds, seeds, self._FOLD_PLAN.format(num_folds))
+        # Each feature set is freed once all of its tests are done.
+        for fs in features_set.values():
+            fs.acquire()
 
         with open(self._TEST_DEBUG, mode="a") as f_debug:
             cur_dt = str(datetime.datetime.now())
@@ -90,67 +156,203 @@ class Classify:
                 else:
                     f_debug.write("{0}\n".format(fs_names[i]))
 
-        for features in features_set:
-            for cls in classifiers:
-                print("Testing features [{0}] with {1}.".format(
-                    features, cls))
-                seed = 99999999
-                result_file = "{0}_{1}-fold_results.csv".format(
-                    cls.NAME, num_folds)
-                # If the results file does not exist we should create
-                # one and write a header to it.
-                if not path.isfile(result_file):
-                    print("Creating file: {0}".format(result_file))
-                    with open(result_file, mode="w") as f_results:
-                        f_results.write(csv_headings)
-                for trial_num in range(1, num_trials+1):
-                    skf = self._iscx2012_loader.get_kfold(num_folds,
-                                                          seed)
-                    # create the classifier, pass the data through
-                    # call classify
-                    results = cls(
-                        self._config_loader.get_classifier_config(),
-                        features_set[features], labels, skf).classify()
-                    print("\tWriting results for trial {0}.".format(
-                        trial_num))
-                    try:
-                        with open(self._TEST_DEBUG, mode="a") as \
-                                f_debug:
-                            cur_dt = str(datetime.datetime.now())
-                            f_debug.write("{0}\t\tWriting "
-                                          "test results to "
-                                          "file: {1}\tfeatures:{2}"
-                                          "\ttrial: {3}\n".format(
-                                           cur_dt, result_file,
-                                           features, trial_num))
-                        f_results = open(result_file, mode="a")
-                        for r in results:
-                            line = "{0}, {1}, {2}, {3}, {4}\n".format(
-                                cls.NAME, features, seed, trial_num,
-                                str(r)[1:-1])
-                            f_results.write(line)
-                    except IOError as err:
-                        print("IOError writing results to file: "
-                              "{0}".format(err))
-                        with open(self._TEST_DEBUG, mode="a") as f_debug:
-                            cur_dt = str(datetime.datetime.now())
-                            f_debug.write("{0}\t\tIOError writing "
-                                          "results to file: "
-                                          "{1}\n".format(cur_dt, err))
-                    finally:
-                        f_results.close()
-                    seed += 1
+        result_files = {}
+        for cls in classifiers:
+            result_files[cls.NAME] = "{0}_{1}-fold_results.csv".format(
+                cls.NAME, num_folds)
+        durability = self._results_config.get("durability", "fsync")
+        # The results are also kept in a store that can be queried with
+        # results_report.py.
+        store = ResultsStore(self._RESULTS_STORE.format(num_folds),
+                             csv_headings, durability)
+        # The rows are written in the order of a serial run however the
+        # tasks are run.
+        order = SerialOrder(list(features_set.keys()), num_trials,
+                            num_folds)
+        sink = ResultsSink(
+            result_files, csv_headings, order, store=store,
+            debug_file=self._TEST_DEBUG,
+            batch_rows=self._results_config.get("batch_rows", 300),
+            flush_seconds=self._results_config.get("flush_seconds", 30.0),
+            durability=durability)
+        try:
+            sink.open()
+        except (IOError, ValueError) as err:
+            print("Unable to open the results files: {0}".format(err))
+            sys.exit(-1)
+        # If a previous run of this experiment was interrupted then it
+        # is picked up from where it stopped.
+        run_info = {"num_folds": num_folds, "seeds": seeds,
+                    "labels_hash": fold_plan.get_labels_hash(),
+                    "feature_sets": list(features_set.keys()),
+                    "classifiers": [cls.NAME for cls in classifiers],
+                    "trace_memory": self._trace_memory}
+        manifest = RunManifest(self._MANIFEST.format(num_folds))
+        completed = manifest.open(run_info, [result_files[cls.NAME] for
+                                             cls in classifiers])
+        sink.set_manifest(manifest)
+        coordinator = None
+        if coordinator_address is not None:
+            coordinator_info = dict(run_info)
+            coordinator_info["classifier_config"] = \
+                self._config_loader.get_classifier_config()
+            coordinator = GridCoordinator(coordinator_address,
+                                          self._get_grid_authkey(),
+                                          coordinator_info)
+        scheduler = ExperimentScheduler(
+            features_set, labels, fold_plan, classifiers,
+            self._config_loader.get_classifier_config(),
+            workers=self._workers, fold_major=self._fold_major,
+            completed=completed, cost_file=self._TASK_COSTS,
+            coordinator=coordinator)
+        # The scheduler gives back the results of each task as it
+        # finishes, and the sink puts them back in order.
+        try:
+            with tracing.span("run_tests"):
+                for cls_name, features, trial_num, results in \
+                        scheduler.run():
+                    print("\tWriting results of {0} for trial {1}.".format(
+                        cls_name, trial_num))
+                    sink.put(cls_name, features,
+                             fold_plan.get_seed(trial_num-1), trial_num,
+                             results)
+        finally:
+            sink.close()
+        manifest.remove()
+        tracing.disable()
+        if self._trace_file is not None:
+            self._export_trace()
 
         with open(self._TEST_DEBUG, mode="a") as f_debug:
             cur_dt = str(datetime.datetime.now())
             f_debug.write("{0}\t Test finished\n".format(cur_dt))
         print("TEST COMPLETE: Exiting...")
 
+    def run_worker(self, coordinator_address):
+        """Run tests served by a coordinator on another host.
+
+        :param coordinator_address: Tuple of the host and port of the
+        coordinator.
+        """
+        authkey = self._get_grid_authkey()
+        if self._trace_file is not None or self._trace_memory:
+            tracing.enable(self._trace_file, memory=self._trace_memory)
+        with profiling.profile("load"):
+            loaded = self._iscx2012_loader.load_data()
+        if not loaded:
+            print("Failed to read data from file.")
+            sys.exit(-1)
+        features_set, labels = self._iscx2012_loader.get_data()
+
+        def prepare(num_folds, seeds):
+            fold_plan = self._iscx2012_loader.get_fold_plan(
+                num_folds, seeds, self._FOLD_PLAN.format(num_folds))
+            return features_set, labels, fold_plan
+
+        worker = GridWorker(coordinator_address, authkey,
+                            self._CLASSIFIERS)
+        finished = worker.run(prepare)
+        tracing.disable()
+        if not finished:
+            sys.exit(-1)
+        print("WORKER COMPLETE: Exiting...")
+
+    def _export_trace(self):
+        """Write the trace of the run as a Chrome trace file, and the
+        memory report if memory was traced, next to the JSON lines
+        trace.
+        """
+        trace_file = path.splitext(self._trace_file)[0] + ".chrome.json"
+        try:
+            num_spans = tracing.export_chrome_trace(self._trace_file,
+                                                    trace_file)
+        except (IOError, ValueError) as err:
+            print("Unable to export the trace: {0}".format(err))
+            return
+        print("Wrote {0} spans to: {1}".format(num_spans, trace_file))
+        if not self._trace_memory:
+            return
+        report_file = path.splitext(self._trace_file)[0] + ".memory.csv"
+        try:
+            num_groups = tracing.export_memory_report(self._trace_file,
+                                                      report_file)
+        except (IOError, ValueError) as err:
+            print("Unable to write the memory report: {0}".format(err))
+            return
+        print("Wrote the memory of {0} stages to: {1}".format(num_groups,
+                                                            report_file))
+
+    def _get_grid_authkey(self):
+        """Return the key shared by the coordinator and workers.
+
+        The key is taken from the environment if it is set there,
+        otherwise it is read from grid_authkey_file. Anyone who knows
+        the key can run code on the coordinator and the workers, so the
+        file must only be accessible by its owner.
+
+        :return: The key as a string.
+        """
+        authkey = os.environ.get(self._GRID_AUTHKEY_ENV)
+        if authkey is None and self._grid_authkey_file:
+            key_file = path.expanduser(self._grid_authkey_file)
+            try:
+                if os.stat(key_file).st_mode & (stat.S_IRWXG |
+                                                stat.S_IRWXO):
+                    print("ERROR: {0} must only be accessible by its "
+                          "owner (chmod 600).".format(key_file))
+                    sys.exit(-1)
+                with open(key_file) as f_key:
+                    authkey = f_key.read().strip()
+            except (IOError, OSError) as err:
+                print("ERROR: Unable to read the grid key: {0}".format(err))
+                sys.exit(-1)
+        if authkey is None:
+            print("ERROR: {0} or grid_authkey_file in the experiment "
+                  "config must be set to run on several hosts.".format(
+                      self._GRID_AUTHKEY_ENV))
+            sys.exit(-1)
+        if len(authkey) < self._MIN_AUTHKEY_LEN:
+            print("ERROR: The grid key must be at least {0} "
+                  "characters.".format(self._MIN_AUTHKEY_LEN))
+            sys.exit(-1)
+        return authkey
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Test classifiers on the ISCX 2012 IDS data set.")
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument("--coordinator", metavar="[HOST:]PORT",
+                      help="serve the tests to workers on other hosts "
+                           "instead of running them here. Only listens "
+                           "on localhost unless HOST is given")
+    role.add_argument("--worker", metavar="HOST:PORT",
+                      help="run tests served by the coordinator at this "
+                           "address")
+    parser.add_argument("--profile", metavar="UNIT[,UNIT]",
+                        help="profile units of the run with cProfile: "
+                             "{0}".format(", ".join(profiling.UNITS)))
+    parser.add_argument("--profile-every", metavar="N", type=int, default=1,
+                        help="only profile every Nth fold (default: 1)")
+    parser.add_argument("--profile-dir", metavar="DIR", default="profiles",
+                        help="directory to write the pstats and collapsed "
+                             "stack files to (default: profiles)")
+    args = parser.parse_args()
+    if args.profile is not None:
+        try:
+            profiling.enable(args.profile_dir, args.profile.split(","),
+                             args.profile_every)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
     config_file_name = "classifiers.yaml"
+    experiment_file_name = "experiment.yaml"
     files = ["TestbedTueJun15-1Flows.xml",
              "TestbedTueJun15-2Flows.xml",
              "TestbedTueJun15-3Flows.xml"]
-    c = Classify(config_file_name, files)
-    c.run_tests()
+    c = Classify(config_file_name, files, experiment_file_name)
+    if args.worker is not None:
+        c.run_worker(parse_address(args.worker))
+    elif args.coordinator is not None:
+        c.run_tests(parse_address(args.coordinator))
+    else:
+        c.run_tests()
@@ -21,13 +21,17 @@ class ConfigLoader:
     """Handles the loading of configuration data from YAML files.
     """
 
-    def __init__(self, config_file_path):
+    def __init__(self, config_file_path, experiment_file_path=None):
         """Initialise.
 
         :param config_file_path: Path to the classifier config file.
+        :param experiment_file_path: Path to the experiment config
+        file, if there is one.
         """
         self._file_path = config_file_path
+        self._experiment_file_path = experiment_file_path
         self._classifier_conf = None
+        self._experiment_conf = {}
 
     def read_config(self):
         """Parse configuration file/s.
@@ -48,6 +52,23 @@ class ConfigLoader:
             return False
         finally:
             conf_file.close()
+        if self._experiment_file_path is not None:
+            return self._read_experiment_config()
+        return True
+
+    def _read_experiment_config(self):
+        """Parse the experiment configuration file.
+
+        :return: True if successful, False otherwise.
+        """
+        try:
+            with open(self._experiment_file_path, "r") as conf_file:
+                print("Reading configuration from: {0}".format(
+                    self._experiment_file_path))
+                self._experiment_conf = yaml.load(conf_file) or {}
+        except IOError as err:
+            print("ERROR: {0}".format(err))
+            return False
         return True
 
     def get_classifier_config(self):
@@ -56,3 +77,10 @@ class ConfigLoader:
         :return: Dict of configuration information.
         """
         return self._classifier_conf
+
+    def get_experiment_config(self):
+        """Return the configuration information for the experiment.
+
+        :return: Dict of configuration information.
+        """
+        return self._experiment_conf
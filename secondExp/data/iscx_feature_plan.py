@@ -0,0 +1,217 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+import re
+
+from iscx_flow_table import FIELD_DTYPES
+import iscx_feature_engine as engine
+import tracing
+
+__author__ = "Jarrod N. Bakker"
+
+
+"""This file contains the compiler for feature sets declared as
+expressions.
+
+A feature set is written as a whitespace separated list of features,
+e.g. "log(totalSourceBytes) totalSourcePackets FlowDuration". A feature
+is one of:
+    - a numeric ISCX flow field, e.g. totalSourceBytes,
+    - a derived feature, e.g. FlowDuration,
+    - a function of a feature, e.g. log(totalSourceBytes),
+    - the ratio of two features, e.g.
+      totalSourceBytes/totalSourcePackets.
+"""
+
+# Derived features and the raw fields that they are computed from.
+_DERIVED = {"FlowDuration": (engine.flow_duration,
+                             ["startDateTime", "stopDateTime"])}
+_FUNCTIONS = {"log": engine.safe_log}
+_TOKEN = re.compile(r"\s*(?:([A-Za-z_]\w*)|(.))")
+
+
+class FeaturePlan:
+    """A set of feature set expressions compiled into a plan in which
+    every distinct feature, and every sub-expression of one, is
+    computed once and shared between the feature sets.
+    """
+
+    def __init__(self, feature_sets):
+        """Initialise.
+
+        :param feature_sets: List of feature set expressions. Each
+        expression is also used as the name of the feature set.
+        """
+        self._nodes = {}  # Feature key to (operation, argument keys)
+        self._sets = OrderedDict()  # Feature set to list of keys
+        self._cache = {}
+        for fs in feature_sets:
+            self._sets[fs] = [self._add(f) for f in _parse(fs)]
+
+    def get_names(self):
+        """Return the names of the feature sets.
+
+        :return: List of feature set names in declaration order.
+        """
+        return list(self._sets.keys())
+
+    def required_fields(self):
+        """Return the raw flow fields needed by the feature sets.
+
+        :return: Sorted list of ISCX field names.
+        """
+        fields = set()
+        for op, args in self._nodes.values():
+            if op == "field":
+                fields.add(args[0])
+            elif op == "derived":
+                fields.update(_DERIVED[args[0]][1])
+        return sorted(fields)
+
+    def evaluate(self, data, name):
+        """Compute a feature set.
+
+        Features already computed for another feature set are reused.
+
+        :param data: FlowTable to compute the features from.
+        :param name: Name of the feature set.
+        :return: float32 matrix of the features.
+        """
+        return engine.feature_matrix([self._column(data, key) for key in
+                                      self._sets[name]])
+
+    def clear_cache(self):
+        """Free the features kept for sharing between feature sets.
+        """
+        self._cache = {}
+
+    def _column(self, data, key):
+        """Compute a feature, or return it from the cache.
+
+        :param data: FlowTable to compute the feature from.
+        :param key: Key of the feature.
+        :return: float64 array.
+        """
+        if key in self._cache:
+            return self._cache[key]
+        op, args = self._nodes[key]
+        with tracing.span("feature", feature=key) as span:
+            if op == "field":
+                result = engine.column(data, args[0])
+            elif op == "derived":
+                result = _DERIVED[args[0]][0](data)
+            elif op == "ratio":
+                result = engine.safe_ratio(self._column(data, args[0]),
+                                           self._column(data, args[1]))
+            else:
+                result = _FUNCTIONS[op](self._column(data, args[0]))
+            span.set(bytes_per_flow=tracing.bytes_per_flow(result.nbytes,
+                                                           len(result)))
+        self._cache[key] = result
+        return result
+
+    def _add(self, expr):
+        """Add a parsed feature, and its sub-expressions, to the plan.
+
+        :param expr: Parsed feature as a nested tuple.
+        :return: Key of the feature.
+        """
+        op = expr[0]
+        if op in ("field", "derived"):
+            key = expr[1]
+            args = (expr[1],)
+        elif op == "ratio":
+            args = (self._add(expr[1]), self._add(expr[2]))
+            key = "{0}/{1}".format(*args)
+        else:
+            args = (self._add(expr[1]),)
+            key = "{0}({1})".format(op, args[0])
+        self._nodes[key] = (op, args)
+        return key
+
+
+def _parse(feature_set):
+    """Parse a feature set expression.
+
+    :param feature_set: Feature set expression.
+    :return: List of features as nested tuples.
+    """
+    tokens = _tokenise(feature_set)
+    features = []
+    pos = 0
+    while pos < len(tokens):
+        feature, pos = _parse_ratio(tokens, pos, feature_set)
+        features.append(feature)
+    if not features:
+        raise ValueError("Empty feature set")
+    return features
+
+
+def _tokenise(feature_set):
+    """Split a feature set expression into tokens.
+
+    :param feature_set: Feature set expression.
+    :return: List of tokens.
+    """
+    tokens = []
+    for name, symbol in _TOKEN.findall(feature_set.strip()):
+        tokens.append(name if name else symbol)
+    return tokens
+
+
+def _parse_ratio(tokens, pos, feature_set):
+    """Parse a feature, which may be a ratio of features.
+
+    :param tokens: List of tokens.
+    :param pos: Index of the first token of the feature.
+    :param feature_set: Expression being parsed, for error messages.
+    :return: The feature as a nested tuple and the index of the next
+    token.
+    """
+    feature, pos = _parse_atom(tokens, pos, feature_set)
+    while pos < len(tokens) and tokens[pos] == "/":
+        divisor, pos = _parse_atom(tokens, pos+1, feature_set)
+        feature = ("ratio", feature, divisor)
+    return feature, pos
+
+
+def _parse_atom(tokens, pos, feature_set):
+    """Parse a field, derived feature or function call.
+
+    :param tokens: List of tokens.
+    :param pos: Index of the first token of the feature.
+    :param feature_set: Expression being parsed, for error messages.
+    :return: The feature as a nested tuple and the index of the next
+    token.
+    """
+    if pos >= len(tokens):
+        raise ValueError("Unexpected end of feature set: "
+                         "{0}".format(feature_set))
+    name = tokens[pos]
+    if pos+1 < len(tokens) and tokens[pos+1] == "(":
+        if name not in _FUNCTIONS:
+            raise ValueError("Unknown function {0} in feature set: "
+                             "{1}".format(name, feature_set))
+        arg, pos = _parse_ratio(tokens, pos+2, feature_set)
+        if pos >= len(tokens) or tokens[pos] != ")":
+            raise ValueError("Missing ) in feature set: "
+                             "{0}".format(feature_set))
+        return (name, arg), pos+1
+    if name in _DERIVED:
+        return ("derived", name), pos+1
+    if name in FIELD_DTYPES:
+        return ("field", name), pos+1
+    raise ValueError("Unknown feature {0} in feature set: {1}".format(
+        name, feature_set))
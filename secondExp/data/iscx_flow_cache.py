@@ -0,0 +1,166 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from iscx_flow_table import FlowTable
+
+__author__ = "Jarrod N. Bakker"
+
+
+class FlowCache:
+    """Binary cache of parsed ISCX flow files.
+
+    The columns of a parsed file are saved as .npy files in a directory
+    next to the XML file. Each cache entry is keyed by a hash of the
+    XML contents, the parser version and the fields that were kept, so
+    an entry is never used for a file that has since changed. Entries
+    are memory-mapped when loaded.
+    """
+
+    _CACHE_SUFFIX = ".cache"
+    _LABELS_FILE = "labels.npy"
+    _STAMP_FILE = "stamp.json"
+    _READ_SIZE = 1 << 20
+
+    def __init__(self, fields, parser_version):
+        """Initialise.
+
+        :param fields: List of the fields held in each cached table.
+        :param parser_version: Version of the parser that produced the
+        tables. Bump it whenever the parsed output changes.
+        """
+        self._fields = list(fields)
+        self._parser_version = parser_version
+
+    def load(self, fname):
+        """Load the parsed form of a flow file from the cache.
+
+        :param fname: Name of the XML file.
+        :return: FlowTable, or None if there is no up to date entry.
+        """
+        entry_dir = os.path.join(self._cache_dir(fname),
+                                 self._cache_key(fname))
+        if not os.path.isdir(entry_dir):
+            return None
+        print("Loading cached data for: {0}".format(fname))
+        columns = {}
+        for f in self._fields:
+            columns[f] = np.load(os.path.join(entry_dir, f + ".npy"),
+                                 mmap_mode="r")
+        labels = np.load(os.path.join(entry_dir, self._LABELS_FILE),
+                         mmap_mode="r")
+        return FlowTable(columns, labels)
+
+    def store(self, fname, flow_table):
+        """Save the parsed form of a flow file to the cache.
+
+        Stale entries for the file are removed. Failing to write the
+        cache is not fatal as the data can always be parsed again.
+
+        :param fname: Name of the XML file.
+        :param flow_table: FlowTable parsed from the file.
+        :return: True if successful, False otherwise.
+        """
+        cache_dir = self._cache_dir(fname)
+        key = self._cache_key(fname)
+        tmp_dir = None
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # Write into a temporary directory then rename it so that a
+            # half written entry is never picked up.
+            tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+            for f in self._fields:
+                np.save(os.path.join(tmp_dir, f + ".npy"), flow_table[f])
+            np.save(os.path.join(tmp_dir, self._LABELS_FILE),
+                    flow_table.get_labels())
+            for entry in os.listdir(cache_dir):
+                entry_path = os.path.join(cache_dir, entry)
+                if entry != key and entry_path != tmp_dir and \
+                        os.path.isdir(entry_path):
+                    shutil.rmtree(entry_path, ignore_errors=True)
+            os.rename(tmp_dir, os.path.join(cache_dir, key))
+        except (IOError, OSError) as err:
+            print("ERROR: Could not cache data for {0}: {1}".format(
+                fname, err))
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        return True
+
+    def _cache_dir(self, fname):
+        """Return the cache directory of a flow file.
+
+        :param fname: Name of the XML file.
+        :return: Path of the directory.
+        """
+        return fname + self._CACHE_SUFFIX
+
+    def _cache_key(self, fname):
+        """Return the key of the cache entry for a flow file.
+
+        :param fname: Name of the XML file.
+        :return: Key as a hex string.
+        """
+        key = hashlib.sha1()
+        key.update(self._content_hash(fname).encode("ascii"))
+        key.update(str(self._parser_version).encode("ascii"))
+        key.update(",".join(sorted(self._fields)).encode("ascii"))
+        return key.hexdigest()
+
+    def _content_hash(self, fname):
+        """Return a hash of the contents of a flow file.
+
+        Hashing a multi-GB file takes a while so the hash is recorded
+        in the cache directory along with the size and modification
+        time of the file. The file is only hashed again if either of
+        those have changed.
+
+        :param fname: Name of the XML file.
+        :return: Hash as a hex string.
+        """
+        st = os.stat(fname)
+        stamp_path = os.path.join(self._cache_dir(fname),
+                                  self._STAMP_FILE)
+        try:
+            with open(stamp_path, "r") as f_stamp:
+                stamp = json.load(f_stamp)
+            if stamp["size"] == st.st_size and \
+                    stamp["mtime"] == st.st_mtime:
+                return stamp["sha1"]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        content_hash = hashlib.sha1()
+        with open(fname, "rb") as f_xml:
+            block = f_xml.read(self._READ_SIZE)
+            while block:
+                content_hash.update(block)
+                block = f_xml.read(self._READ_SIZE)
+        digest = content_hash.hexdigest()
+        try:
+            if not os.path.isdir(self._cache_dir(fname)):
+                os.makedirs(self._cache_dir(fname))
+            with open(stamp_path, "w") as f_stamp:
+                json.dump({"size": st.st_size, "mtime": st.st_mtime,
+                           "sha1": digest}, f_stamp)
+        except (IOError, OSError):
+            pass
+        return digest
@@ -0,0 +1,205 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import re
+
+import numpy as np
+
+__author__ = "Jarrod N. Bakker"
+
+
+"""This file contains a byte offset index of the flows in an ISCX
+dataset XML so that a single file can be parsed in pieces.
+
+The flows are the children of the root element and are found by
+scanning for their start tag. This relies on the flow data never
+holding a raw '<', which is true of the ISCX files as the payloads are
+escaped and no CDATA sections are used.
+"""
+
+# Matches the first start tag in a block, skipping the XML
+# declaration, comments and doctype.
+_START_TAG = re.compile(br"<([^\s?!/>][^\s/>]*)")
+_SCAN_SIZE = 1 << 24
+
+
+class FlowIndex:
+    """Byte offsets of the start of every flow in an ISCX dataset XML.
+    """
+
+    def __init__(self, fname, offsets, body_end):
+        """Initialise.
+
+        :param fname: Name of the XML file.
+        :param offsets: Sorted int64 array of the byte offset of each
+        flow start tag.
+        :param body_end: Byte offset of the root end tag.
+        """
+        self._fname = fname
+        self._offsets = offsets
+        self._body_end = body_end
+
+    @staticmethod
+    def build(fname):
+        """Scan an ISCX dataset XML for the start of every flow.
+
+        :param fname: Name of the XML file.
+        :return: FlowIndex object.
+        """
+        print("Indexing flows in: {0}".format(fname))
+        with open(fname, "rb") as f_xml:
+            head = f_xml.read(_SCAN_SIZE)
+            root = _START_TAG.search(head)
+            if root is None:
+                return FlowIndex(fname, np.array([], dtype=np.int64), 0)
+            root_tag = root.group(1)
+            flow = _START_TAG.search(head, head.index(b">", root.end()))
+            if flow is None:
+                return FlowIndex(fname, np.array([], dtype=np.int64), 0)
+            flow_tag = flow.group(1)
+            offsets = _scan_offsets(f_xml, flow_tag, flow.start())
+            size = os.fstat(f_xml.fileno()).st_size
+            tail_start = max(0, size - _SCAN_SIZE)
+            f_xml.seek(tail_start)
+            body_end = tail_start + f_xml.read().rindex(b"</" + root_tag)
+        return FlowIndex(fname, offsets, body_end)
+
+    def __len__(self):
+        """Return the number of flows in the file.
+
+        :return: Number as an integer.
+        """
+        return len(self._offsets)
+
+    def split(self, num_ranges):
+        """Split the flows into runs of roughly equal size in bytes.
+
+        :param num_ranges: The number of runs to form.
+        :return: List of FlowRange objects in file order.
+        """
+        if len(self._offsets) == 0:
+            return []
+        first = int(self._offsets[0])
+        targets = first + (self._body_end-first) * \
+            np.arange(1, num_ranges) // num_ranges
+        cuts = np.searchsorted(self._offsets, targets)
+        cuts = cuts[cuts < len(self._offsets)]
+        starts = np.unique(np.concatenate(([first],
+                                           self._offsets[cuts])))
+        ends = np.append(starts[1:], self._body_end)
+        return [FlowRange(self._fname, first, self._body_end, int(s),
+                          int(e)) for s, e in zip(starts, ends)]
+
+
+class FlowRange:
+    """A run of whole flows within an ISCX dataset XML.
+
+    Opening a range gives a file-like object that reads as a complete
+    document: the original XML header and root start tag, the flows in
+    the range and the root end tag.
+    """
+
+    def __init__(self, fname, header_end, footer_start, start, end):
+        """Initialise.
+
+        :param fname: Name of the XML file.
+        :param header_end: Byte offset of the first flow in the file.
+        :param footer_start: Byte offset of the root end tag.
+        :param start: Byte offset of the first flow in the range.
+        :param end: Byte offset just past the last flow in the range.
+        """
+        self.fname = fname
+        self.header_end = header_end
+        self.footer_start = footer_start
+        self.start = start
+        self.end = end
+
+    def open(self):
+        """Open the range for reading.
+
+        :return: File-like object with read() and close() methods.
+        """
+        return _RangeReader(self)
+
+
+class _RangeReader:
+    """Reads the pieces of a FlowRange one after another.
+    """
+
+    def __init__(self, flow_range):
+        """Initialise.
+
+        :param flow_range: FlowRange to read.
+        """
+        self._file = open(flow_range.fname, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._parts = [(0, flow_range.header_end),
+                       (flow_range.start, flow_range.end),
+                       (flow_range.footer_start, size)]
+        self._part = 0
+        self._file.seek(0)
+
+    def read(self, size=-1):
+        """Read up to size bytes.
+
+        :param size: Maximum number of bytes to read, -1 for all.
+        :return: The bytes read, empty once the range is exhausted.
+        """
+        while self._part < len(self._parts):
+            part_end = self._parts[self._part][1]
+            remaining = part_end - self._file.tell()
+            if remaining > 0:
+                if size < 0 or size > remaining:
+                    size = remaining
+                return self._file.read(size)
+            self._part += 1
+            if self._part < len(self._parts):
+                self._file.seek(self._parts[self._part][0])
+        return b""
+
+    def close(self):
+        """Close the underlying file.
+        """
+        self._file.close()
+
+
+def _scan_offsets(f_xml, flow_tag, start):
+    """Find the byte offset of every flow start tag.
+
+    :param f_xml: Open XML file.
+    :param flow_tag: Tag of the flow elements as bytes.
+    :param start: Byte offset to start scanning from.
+    :return: Sorted int64 array of offsets.
+    """
+    pattern = re.compile(b"<" + re.escape(flow_tag) + br"[\s>/]")
+    # Enough of the previous block is kept to catch a tag split across
+    # two blocks, but not enough to match the same tag twice.
+    keep = len(flow_tag) + 1
+    chunks = []
+    base = start
+    carry = b""
+    f_xml.seek(start)
+    block = f_xml.read(_SCAN_SIZE)
+    while block:
+        data = carry + block
+        chunks.append(np.fromiter((base + m.start() for m in
+                                   pattern.finditer(data)),
+                                  dtype=np.int64))
+        carry = data[-keep:]
+        base += len(data) - len(carry)
+        block = f_xml.read(_SCAN_SIZE)
+    if not chunks:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(chunks)
@@ -0,0 +1,202 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+__author__ = "Jarrod N. Bakker"
+
+
+"""This file contains the columnar in-memory form of the ISCX flows.
+"""
+
+# Column type of the numeric ISCX flow fields. Timestamps are stored
+# as seconds since the epoch. Any field not listed is kept as text.
+FIELD_DTYPES = {"totalSourceBytes": np.uint64,
+                "totalDestinationBytes": np.uint64,
+                "totalSourcePackets": np.uint32,
+                "totalDestinationPackets": np.uint32,
+                "sourcePort": np.uint16,
+                "destinationPort": np.uint16,
+                "startDateTime": np.int64,
+                "stopDateTime": np.int64}
+TIMESTAMP_FIELDS = ("startDateTime", "stopDateTime")
+LABEL_DTYPE = np.int8
+
+
+class FlowTable:
+    """A table of flows with one typed NumPy array per field.
+    """
+
+    def __init__(self, columns, labels):
+        """Initialise.
+
+        :param columns: Dict of field name to column array.
+        :param labels: Array of TagValue labels, one per flow.
+        """
+        self._columns = columns
+        self._labels = labels
+
+    def __getitem__(self, field):
+        """Return the column of a field.
+
+        :param field: Name of the ISCX field.
+        :return: The column as a NumPy array.
+        """
+        return self._columns[field]
+
+    def __len__(self):
+        """Return the number of flows in the table.
+
+        :return: Number as an integer.
+        """
+        return len(self._labels)
+
+    def get_fields(self):
+        """Return the names of the fields held in the table.
+
+        :return: List of field names.
+        """
+        return list(self._columns.keys())
+
+    def get_labels(self):
+        """Return the label of each flow.
+
+        :return: Array of TagValue labels as int8.
+        """
+        return self._labels
+
+    def nbytes(self):
+        """Return the memory used by the columns and labels.
+
+        :return: Number of bytes as an integer.
+        """
+        return sum(c.nbytes for c in self._columns.values()) + \
+            self._labels.nbytes
+
+    @staticmethod
+    def concatenate(tables):
+        """Join tables holding the same fields, one after another.
+
+        :param tables: List of FlowTable objects.
+        :return: A single FlowTable.
+        """
+        if len(tables) == 1:
+            return tables[0]
+        columns = {}
+        for field in tables[0].get_fields():
+            columns[field] = np.concatenate([t[field] for t in tables])
+        labels = np.concatenate([t.get_labels() for t in tables])
+        return FlowTable(columns, labels)
+
+
+class FlowTableBuilder:
+    """Build a FlowTable from flows that arrive one at a time.
+
+    Flows are buffered as text and converted into typed columns in
+    batches so that the buffers stay small however many flows there
+    are.
+    """
+
+    _BATCH_SIZE = 65536
+
+    def __init__(self, fields):
+        """Initialise.
+
+        :param fields: List of the field names to store.
+        """
+        self._fields = list(fields)
+        self._pending = dict((f, []) for f in self._fields)
+        self._pending_labels = []
+        self._chunks = dict((f, []) for f in self._fields)
+        self._label_chunks = []
+
+    def append(self, flow_data, label):
+        """Add a flow to the table.
+
+        :param flow_data: Dict of field name to text value.
+        :param label: TagValue of the flow.
+        """
+        for f in self._fields:
+            self._pending[f].append(flow_data.get(f))
+        self._pending_labels.append(label)
+        if len(self._pending_labels) >= self._BATCH_SIZE:
+            self._flush()
+
+    def build(self):
+        """Convert all of the flows added so far into a table.
+
+        :return: FlowTable object.
+        """
+        self._flush()
+        columns = {}
+        for f in self._fields:
+            columns[f] = _join_chunks(self._chunks[f], _column_dtype(f))
+        labels = _join_chunks(self._label_chunks, LABEL_DTYPE)
+        return FlowTable(columns, labels)
+
+    def _flush(self):
+        """Convert the buffered flows into typed column chunks.
+        """
+        if not self._pending_labels:
+            return
+        for f in self._fields:
+            self._chunks[f].append(_to_column(f, self._pending[f]))
+            self._pending[f] = []
+        self._label_chunks.append(np.array(self._pending_labels,
+                                           dtype=LABEL_DTYPE))
+        self._pending_labels = []
+
+
+def _column_dtype(field):
+    """Return the dtype that a field is stored as.
+
+    :param field: Name of the ISCX field.
+    :return: NumPy dtype, or None for text fields.
+    """
+    return FIELD_DTYPES.get(field)
+
+
+def _to_column(field, values):
+    """Convert the text values of a field into a typed array.
+
+    :param field: Name of the ISCX field.
+    :param values: List of the text values.
+    :return: NumPy array.
+    """
+    dtype = _column_dtype(field)
+    # Empty elements are read as None, treat them as empty text or zero
+    if dtype is None:
+        if None in values:
+            values = ["" if v is None else v for v in values]
+        return np.array(values)
+    if None in values:
+        zero = "1970-01-01T00:00:00" if field in TIMESTAMP_FIELDS else "0"
+        values = [zero if v is None else v for v in values]
+    if field in TIMESTAMP_FIELDS:
+        return np.array(values, dtype="datetime64[s]").astype(dtype)
+    return np.array(values, dtype=dtype)
+
+
+def _join_chunks(chunks, dtype):
+    """Join column chunks into a single array.
+
+    :param chunks: List of arrays.
+    :param dtype: dtype of an empty column, None for text.
+    :return: NumPy array.
+    """
+    if not chunks:
+        return np.array([], dtype=dtype if dtype is not None else str)
+    if len(chunks) == 1:
+        return chunks[0]
+    return np.concatenate(chunks)
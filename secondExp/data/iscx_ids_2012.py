@@ -12,12 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import OrderedDict
+from functools import partial
+from multiprocessing import Pool
+from os import path
 import random
 from lxml import etree
 
+import numpy as np
 from sklearn.cross_validation import StratifiedKFold
 
+from iscx_flow_cache import FlowCache
+from iscx_flow_index import FlowIndex
+from iscx_feature_plan import FeaturePlan
+from iscx_flow_table import FlowTable, FlowTableBuilder
+from iscx_fold_plan import FoldPlan
+from iscx_lazy_feature_set import LazyFeatureSet
 import iscx_ids_2012_features as iscx_features
+import tracing
 
 __author__ = "Jarrod N. Bakker"
 
@@ -25,17 +37,33 @@ __author__ = "Jarrod N. Bakker"
 class ISCX2012IDS:
 
     _BASE_PATH = "<INSERT PATH TO FLOW DATA DIRECTORY HERE>"
-
-    def __init__(self, fnames):
+    # Bump this whenever the parsed form of the flows changes so that
+    # stale cache entries are not used.
+    _PARSER_VERSION = 1
+    # Files are only split for parsing in pieces of at least this size.
+    _MIN_RANGE_SIZE = 1 << 26
+
+    def __init__(self, fnames, streaming=False, fields=None,
+                 cache=False, workers=1, feature_sets=None):
         """Initialise.
 
         :param fnames: List of dataset file names.
+        :param streaming: True to walk each XML file with an incremental
+        parser instead of building the whole tree in memory.
+        :param fields: Iterable of the flow fields to keep. Defaults to
+        the fields read by the feature sets.
+        :param cache: True to keep the parsed flows in a binary cache
+        next to each dataset file.
+        :param workers: Number of processes used to parse the dataset
+        files. Large files are split up between the processes.
+        :param feature_sets: List of feature set expressions to
+        compute, see FeaturePlan. Defaults to FEATURE_SETS.
         """
         self._rand = random
         self._dataset_files = []
         for f in fnames:
             self._dataset_files.append(self._BASE_PATH + f)
-        self._raw_data = []
+        self._raw_data = None
         self._labels = []
         self._data = []
         self._train_indices = []
@@ -43,6 +71,20 @@ class ISCX2012IDS:
         self._skf = None
         self._num_normal = 0
         self._num_attack = 0
+        self._streaming = streaming
+        if feature_sets is None:
+            feature_sets = iscx_features.FEATURE_SETS
+        self._feature_plan = FeaturePlan(feature_sets)
+        self._unprocessed_sets = set()
+        if fields is None:
+            fields = self._feature_plan.required_fields()
+        self._fields = [f for f in fields if f != "Tag"]
+        # Tag is always read as it holds the label of each flow.
+        self._parse_tags = self._fields + ["Tag"]
+        self._cache = None
+        if cache:
+            self._cache = FlowCache(self._fields, self._PARSER_VERSION)
+        self._workers = workers
 
     def load_data(self):
         """Load data from data sets, select the features and transform
@@ -50,17 +92,25 @@ class ISCX2012IDS:
 
         :return: True if successful, False otherwise.
         """
-        for fname in self._dataset_files:
-            raw_data, raw_labels = self._read_data(fname)
-            self._raw_data.extend(raw_data)
-            self._labels.extend(raw_labels)
-        self._data = self._process_features(self._raw_data)
+        with tracing.span("load_data",
+                          files=len(self._dataset_files)) as span:
+            tables = self._load_files(self._dataset_files)
+            self._raw_data = FlowTable.concatenate(tables)
+            span.set(flows=len(self._raw_data),
+                     bytes_per_flow=tracing.bytes_per_flow(
+                         self._raw_data.nbytes(), len(self._raw_data)))
+            self._labels = self._raw_data.get_labels()
+            self._num_normal = int(np.count_nonzero(
+                self._labels == TagValue.Normal))
+            self._num_attack = len(self._labels) - self._num_normal
+            self._data = self._process_features(self._raw_data)
         return True
 
     def get_data(self):
         """Return the transformed data and labels.
 
-        :return: The transformed data and labels in separate lists.
+        :return: Dict of LazyFeatureSet objects and an int8 array of
+        labels.
         """
         return self._data, self._labels
 
@@ -76,6 +126,27 @@ class ISCX2012IDS:
         return StratifiedKFold(self._labels, n_folds=num_folds,
                                shuffle=True, random_state=rand_seed)
 
+    def get_fold_plan(self, num_folds, seeds, file_name=None):
+        """Prepare the folds of every trial of a run at once.
+
+        :param num_folds: The number of folds to form in each trial.
+        :param seeds: List of the seed for shuffling the folds of each
+        trial.
+        :param file_name: Name of a .npz file to keep the fold plan in
+        so that it is reused by later runs, None to not keep it.
+        :return: FoldPlan object.
+        """
+        if file_name is not None and path.isfile(file_name):
+            fold_plan = FoldPlan.load(file_name)
+            if fold_plan.matches(self._labels, num_folds, seeds):
+                print("Loaded fold plan from: {0}".format(file_name))
+                return fold_plan
+        fold_plan = FoldPlan.build(self.get_kfold, self._labels,
+                                   num_folds, seeds)
+        if file_name is not None:
+            fold_plan.save(file_name)
+        return fold_plan
+
     def get_test_indices(self):
         """Return the indices in each test set fold.
 
@@ -106,66 +177,225 @@ class ISCX2012IDS:
         """
         return self._num_attack
 
-    def _read_data(self, fname):
+    def _load_files(self, fnames):
+        """Load the flows of dataset files, from the cache if possible.
+
+        :param fnames: List of the files to load the data from.
+        :return: List of FlowTable objects in the same order as fnames.
+        """
+        tables = [None] * len(fnames)
+        if self._cache is not None:
+            tables = [self._cache.load(fname) for fname in fnames]
+        missing = [i for i in range(len(fnames)) if tables[i] is None]
+        parsed = self._read_files([fnames[i] for i in missing])
+        for i, flow_table in zip(missing, parsed):
+            tables[i] = flow_table
+            if self._cache is not None:
+                self._cache.store(fnames[i], flow_table)
+        return tables
+
+    def _read_files(self, fnames):
+        """Read data from ISCX dataset XMLs, in parallel if there are
+        enough workers.
+
+        Each file is parsed whole or, if it is large, as several runs
+        of flows. The pieces are parsed independently by a pool of
+        processes and are stitched back together in file order, so the
+        flows, and therefore the folds, are the same as when the files
+        are read one after another.
+
+        :param fnames: List of the files to read the data from.
+        :return: List of FlowTable objects in the same order as fnames.
+        """
+        if self._workers < 2:
+            return [self._read_data(fname) for fname in fnames]
+        pieces = []  # Tuples of the file index and byte range
+        for i in range(len(fnames)):
+            for byte_range in self._split_file(fnames[i]):
+                pieces.append((i, byte_range))
+        if len(pieces) < 2:
+            return [self._read_data(fname) for fname in fnames]
+        tasks = [(fnames[i], byte_range, self._fields, self._streaming)
+                 for i, byte_range in pieces]
+        pool = Pool(processes=min(self._workers, len(tasks)))
+        try:
+            parsed = pool.map(_read_data_task, tasks)
+        finally:
+            pool.terminate()
+            pool.join()
+        file_tables = [[] for fname in fnames]
+        for (i, byte_range), flow_table in zip(pieces, parsed):
+            file_tables[i].append(flow_table)
+        return [FlowTable.concatenate(t) for t in file_tables]
+
+    def _split_file(self, fname):
+        """Split a dataset file into runs of flows to parse in parallel.
+
+        :param fname: Name of the file to split.
+        :return: List of FlowRange objects, or [None] if the file
+        should be parsed whole.
+        """
+        num_ranges = min(self._workers,
+                         path.getsize(fname) // self._MIN_RANGE_SIZE)
+        if num_ranges < 2:
+            return [None]
+        byte_ranges = FlowIndex.build(fname).split(num_ranges)
+        if len(byte_ranges) < 2:
+            return [None]
+        return byte_ranges
+
+    def _read_data(self, fname, byte_range=None):
         """Read data from an ISCX dataset XML.
 
         :param fname: Name of the file to read the data from.
-        :return: The data and labels.
+        :param byte_range: FlowRange to limit the read to part of the
+        file, None to read all of it.
+        :return: FlowTable of the data and labels.
         """
-        print("Reading data from: {0}".format(fname))
-        data_etree = etree.parse(fname)
-        raw_data, raw_labels = self._etree_to_dict(data_etree)
+        if byte_range is None:
+            print("Reading data from: {0}".format(fname))
+            source = fname
+        else:
+            print("Reading bytes {0}-{1} of: {2}".format(
+                byte_range.start, byte_range.end, fname))
+            source = byte_range.open()
+        try:
+            with tracing.span("read_file", file=path.basename(fname),
+                              streaming=self._streaming) as span:
+                if self._streaming:
+                    # Each flow is converted as soon as it is parsed, so
+                    # parsing and conversion share the one span.
+                    with tracing.span("parse"):
+                        flow_table = self._iterparse_to_table(source)
+                else:
+                    with tracing.span("parse"):
+                        data_etree = etree.parse(source)
+                    with tracing.span("convert"):
+                        flow_table = self._etree_to_table(data_etree)
+                    del data_etree
+                span.set(flows=len(flow_table),
+                         bytes_per_flow=tracing.bytes_per_flow(
+                             flow_table.nbytes(), len(flow_table)))
+        finally:
+            if byte_range is not None:
+                source.close()
         print("\tLoading complete.")
-        return raw_data, raw_labels
+        return flow_table
 
-    def _etree_to_dict(self, etree):
-        """Convert an XML etree into a list of dicts.
+    def _etree_to_table(self, etree):
+        """Convert an XML etree into a FlowTable.
 
-        This method only takes care of elements, not attributes!
+        This method only takes care of elements, not attributes! Only
+        the selected fields are kept.
 
         :param etree: Etree object to process
-        :return: Data as a list of dict.
+        :return: FlowTable of the data and labels.
         """
         root = etree.getroot()
-        data = []
-        labels = []
+        builder = FlowTableBuilder(self._fields)
         for flow in root:
-            flow_data = {}
-            for i in range(len(flow)):
-                if flow[i].tag != "Tag":
-                    flow_data[flow[i].tag] = flow[i].text
+            flow_data, label = self._flow_to_dict(flow)
+            builder.append(flow_data, label)
+        return builder.build()
+
+    def _iterparse_to_table(self, source):
+        """Convert an ISCX dataset XML into a FlowTable without holding
+        the whole tree in memory.
+
+        Flows are the children of the root element. Each flow is
+        converted as soon as its end tag has been parsed and is then
+        cleared, along with the already consumed siblings before it, so
+        the partially built tree never holds more than one flow.
+
+        :param source: Name of the file, or a file-like object, to read
+        the data from.
+        :return: FlowTable of the data and labels.
+        """
+        builder = FlowTableBuilder(self._fields)
+        depth = 0
+        for event, elem in etree.iterparse(source, events=("start",
+                                                           "end")):
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+            flow_data, label = self._flow_to_dict(elem)
+            builder.append(flow_data, label)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+        return builder.build()
+
+    def _flow_to_dict(self, flow):
+        """Convert a single flow element into a dict and its label.
+
+        Children are filtered by tag inside lxml so that the text of
+        unused fields, such as the payloads, is never turned into a
+        Python string.
+
+        :param flow: Flow element to process.
+        :return: The flow data as a dict and its TagValue.
+        """
+        flow_data = {}
+        label = None
+        for child in flow.iterchildren(*self._parse_tags):
+            if child.tag != "Tag":
+                flow_data[child.tag] = child.text
+            else:
+                if child.text == "Normal":
+                    label = TagValue.Normal
                 else:
-                    if flow[i].text == "Normal":
-                        labels.append(TagValue.Normal)
-                        self._num_normal += 1
-                    else:
-                        labels.append(TagValue.Attack)
-                        self._num_attack += 1
-            data.append(flow_data)
-        return data, labels
+                    label = TagValue.Attack
+        return flow_data, label
 
     def _process_features(self, dataset):
-        """Select and process features from the ISCX data.
-
-        :param dataset: Dataset to select features from.
-        :return: The dict:list of feature sets.
-        """
-        print("Processing features from data...")
-        feature_set = {}
-        feature_set["totalSourceBytes totalSourcePackets " \
-                    "FlowDuration"] = iscx_features.tsb_tsp_fl(dataset)
-        feature_set["log(totalSourceBytes) totalSourcePackets " \
-                    "FlowDuration"] = iscx_features.ltsb_tsp_fl(dataset)
-        feature_set["log(totalSourceBytes) log(totalSourcePackets) " \
-                    "FlowDuration"] = iscx_features.ltsb_ltsp_fl(dataset)
-        feature_set["totalSourceBytes totalDestinationBytes " \
-                    "FlowDuration"] = iscx_features.tsb_tdb_fl(dataset)
-        feature_set["totalSourceBytes totalSourcePackets " \
-                    "totalDestinationBytes totalDestinationPackets " \
-                    "FlowDuration"] = \
-            iscx_features.tsb_tsp_tdb_tdp_fl(dataset)
+        """Prepare the feature sets of the ISCX data.
+
+        Each feature set is only computed when it is first asked for.
+        Features shared between feature sets are computed once.
+
+        :param dataset: FlowTable to select features from.
+        :return: The dict:LazyFeatureSet of feature sets.
+        """
+        feature_set = OrderedDict()
+        for name in self._feature_plan.get_names():
+            feature_set[name] = LazyFeatureSet(
+                name, partial(self._compute_feature_set, dataset, name))
+        self._unprocessed_sets = set(feature_set.keys())
         return feature_set
 
+    def _compute_feature_set(self, dataset, name):
+        """Compute a feature set.
+
+        :param dataset: FlowTable to select features from.
+        :param name: Name of the feature set.
+        :return: float32 matrix of the features.
+        """
+        print("Processing features from data: {0}".format(name))
+        with tracing.span("features", feature_set=name) as span:
+            matrix = self._feature_plan.evaluate(dataset, name)
+            span.set(bytes_per_flow=tracing.bytes_per_flow(matrix.nbytes,
+                                                           len(matrix)))
+        self._unprocessed_sets.discard(name)
+        if not self._unprocessed_sets:
+            # Nothing is left to share the computed features with.
+            self._feature_plan.clear_cache()
+        return matrix
+
+
+def _read_data_task(task):
+    """Read an ISCX dataset XML in a worker process.
+
+    :param task: Tuple of the file name, the FlowRange to read (None for
+    the whole file), the fields to keep and whether to stream the file.
+    :return: FlowTable of the data and labels.
+    """
+    fname, byte_range, fields, streaming = task
+    loader = ISCX2012IDS([], streaming=streaming, fields=fields)
+    return loader._read_data(fname, byte_range)
+
 
 class TagValue:
     """Enum for the dataset tag labels.
@@ -0,0 +1,75 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__author__ = "Jarrod N. Bakker"
+
+
+class LazyFeatureSet:
+    """Handle to a feature set that is only computed when it is first
+    asked for.
+
+    Users of the feature set are counted with acquire() and release().
+    Once the last user has released it, the matrix is freed.
+    """
+
+    def __init__(self, name, compute):
+        """Initialise.
+
+        :param name: Name of the feature set.
+        :param compute: Callable with no arguments that returns the
+        feature set as a float32 matrix.
+        """
+        self._name = name
+        self._compute = compute
+        self._matrix = None
+        self._users = 0
+
+    def get_name(self):
+        """Return the name of the feature set.
+
+        :return: Name as a string.
+        """
+        return self._name
+
+    def get(self):
+        """Return the feature set, computing it if needed.
+
+        :return: float32 matrix with one row per flow.
+        """
+        if self._matrix is None:
+            self._matrix = self._compute()
+        return self._matrix
+
+    def is_materialised(self):
+        """Return whether the feature set is currently held in memory.
+
+        :return: True if it is, False otherwise.
+        """
+        return self._matrix is not None
+
+    def acquire(self, count=1):
+        """Register users of the feature set.
+
+        :param count: The number of users to add.
+        """
+        self._users += count
+
+    def release(self):
+        """Unregister a user of the feature set, freeing it once there
+        are no users left.
+        """
+        self._users -= 1
+        if self._users > 0:
+            return
+        self._matrix = None
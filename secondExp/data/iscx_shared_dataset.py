@@ -0,0 +1,152 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from iscx_fold_plan import FoldPlan
+
+__author__ = "Jarrod N. Bakker"
+
+
+class SharedDataset:
+    """The feature sets, labels and folds of a run published once as
+    .npy files that any number of processes memory-map read-only.
+
+    The files are put in shared memory (/dev/shm) where it is
+    available, so every process reads the same pages and none of them
+    holds a copy of its own. A SharedDataset only pickles the names of
+    its files, which makes it cheap to hand to worker processes.
+    """
+
+    _SHM_DIR = "/dev/shm"
+
+    def __init__(self, directory, feature_files, seeds, num_folds,
+                 labels_hash):
+        """Initialise. Use publish() to create a SharedDataset.
+
+        :param directory: Directory holding the files.
+        :param feature_files: Dict of feature set name to file name.
+        :param seeds: List of the seed used to shuffle each trial.
+        :param num_folds: The number of folds in each trial.
+        :param labels_hash: Hash of the labels the folds were formed
+        from.
+        """
+        self._directory = directory
+        self._feature_files = feature_files
+        self._seeds = seeds
+        self._num_folds = num_folds
+        self._labels_hash = labels_hash
+        self._arrays = {}  # File name to memory-mapped array
+
+    @staticmethod
+    def publish(features_set, labels, fold_plan):
+        """Write the data of a run out to be shared.
+
+        Each feature set is released once it has been written, so
+        only one feature set is held in memory at a time.
+
+        :param features_set: Dict of LazyFeatureSet objects.
+        :param labels: Array of the label of each flow.
+        :param fold_plan: FoldPlan of the folds of each trial.
+        :return: SharedDataset object.
+        """
+        parent = None
+        if os.path.isdir(SharedDataset._SHM_DIR):
+            parent = SharedDataset._SHM_DIR
+        directory = tempfile.mkdtemp(prefix="iscx_shared_", dir=parent)
+        try:
+            feature_files = {}
+            for name in features_set:
+                file_name = hashlib.sha1(
+                    name.encode("utf-8")).hexdigest() + ".npy"
+                np.save(os.path.join(directory, file_name),
+                        features_set[name].get())
+                features_set[name].release()
+                feature_files[name] = file_name
+            np.save(os.path.join(directory, "labels.npy"), labels)
+            # The labels as FoldView gathers them, so that no process
+            # needs a converted copy of its own.
+            np.save(os.path.join(directory, "fold_labels.npy"),
+                    np.ascontiguousarray(labels, dtype=np.float32))
+            np.save(os.path.join(directory, "fold_ids.npy"),
+                    fold_plan.get_fold_ids())
+        except (IOError, OSError):
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return SharedDataset(directory, feature_files,
+                             [fold_plan.get_seed(i) for i in
+                              range(fold_plan.get_num_trials())],
+                             fold_plan.get_num_folds(),
+                             fold_plan.get_labels_hash())
+
+    def __getstate__(self):
+        """Return the state to pickle, leaving out the mapped arrays.
+
+        :return: Dict of the state.
+        """
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    def get_feature_set(self, name):
+        """Return a feature set.
+
+        :param name: Name of the feature set.
+        :return: Read-only float32 matrix with one row per flow.
+        """
+        return self._load(self._feature_files[name])
+
+    def get_labels(self):
+        """Return the labels.
+
+        :return: Read-only int8 array.
+        """
+        return self._load("labels.npy")
+
+    def get_fold_labels(self):
+        """Return the labels as FoldView gathers them.
+
+        :return: Read-only float32 array.
+        """
+        return self._load("fold_labels.npy")
+
+    def get_fold_plan(self):
+        """Return the fold plan.
+
+        :return: FoldPlan object.
+        """
+        return FoldPlan(self._load("fold_ids.npy"), self._seeds,
+                        self._num_folds, self._labels_hash)
+
+    def remove(self):
+        """Delete the files. Call this once no process needs them.
+        """
+        self._arrays = {}
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _load(self, file_name):
+        """Memory-map a file, or return it if it is already mapped.
+
+        :param file_name: Name of the file in the directory.
+        :return: Read-only array.
+        """
+        if file_name not in self._arrays:
+            self._arrays[file_name] = np.load(
+                os.path.join(self._directory, file_name), mmap_mode="r")
+        return self._arrays[file_name]
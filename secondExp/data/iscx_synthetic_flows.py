@@ -0,0 +1,430 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from os import path
+import argparse
+import base64
+import sys
+
+import numpy as np
+
+__author__ = "Jarrod N. Bakker"
+
+
+"""This file contains a generator of synthetic flows in the format of
+the ISCX 2012 IDS dataset XMLs, for testing at scale without the real
+data.
+
+Each flow has the same elements, in the same order, as the flows of the
+TestbedTueJun15 files. The values are drawn from per-application
+distributions for normal traffic and for the HTTP flood and IRC
+command and control traffic of the DDoS botnet attack. Flows are made
+and written in chunks, so the output can be far larger than memory.
+The same seed, attack ratio and chunk size always give the same file.
+
+Usage: python iscx_synthetic_flows.py [options] OUTPUT_XML [OUTPUT_XML...]
+"""
+
+# Elements of a flow, in the order they appear in the ISCX files.
+FIELDS = ["appName", "totalSourceBytes", "totalDestinationBytes",
+          "totalDestinationPackets", "totalSourcePackets",
+          "sourcePayloadAsBase64", "sourcePayloadAsUTF",
+          "destinationPayloadAsBase64", "destinationPayloadAsUTF",
+          "direction", "sourceTCPFlagsDescription",
+          "destinationTCPFlagsDescription", "source", "protocolName",
+          "sourcePort", "destination", "destinationPort", "startDateTime",
+          "stopDateTime", "Tag"]
+
+# Applications of each class of traffic: the name, protocol, destination
+# port (0 for a random one), weight, the mean and standard deviation of
+# the log of the source and destination bytes and of the duration in
+# seconds, and the mean bytes per packet.
+_NORMAL_APPS = [
+    ("HTTPWeb", "tcp_ip", 80, 0.52, 6.2, 1.1, 8.3, 2.0, 0.8, 1.9, 560),
+    ("HTTPImageTransfer", "tcp_ip", 80, 0.10, 6.0, 0.8, 9.2, 1.4, 0.5,
+     1.2, 900),
+    ("DNS", "udp_ip", 53, 0.16, 4.0, 0.3, 4.9, 0.5, -3.0, 1.0, 70),
+    ("SecureWeb", "tcp_ip", 443, 0.06, 7.0, 1.2, 8.6, 1.8, 1.5, 1.8, 700),
+    ("SSH", "tcp_ip", 22, 0.02, 7.5, 1.5, 7.8, 1.6, 3.0, 2.0, 120),
+    ("SMTP", "tcp_ip", 25, 0.04, 8.0, 1.5, 5.5, 0.6, 0.8, 1.0, 700),
+    ("IMAP", "tcp_ip", 143, 0.03, 6.0, 0.9, 8.5, 1.8, 1.2, 1.5, 600),
+    ("POP", "tcp_ip", 110, 0.02, 5.2, 0.7, 8.8, 1.8, 0.5, 1.2, 650),
+    ("FTP", "tcp_ip", 21, 0.01, 5.5, 0.8, 6.0, 0.9, 2.0, 1.5, 90),
+    ("IRC", "tcp_ip", 6667, 0.01, 6.5, 1.4, 7.5, 1.6, 4.0, 2.0, 110),
+    ("Unknown_UDP", "udp_ip", 0, 0.03, 5.0, 1.5, 5.0, 1.5, -1.0, 2.0,
+     200),
+]
+_ATTACK_APPS = [
+    ("HTTPWeb", "tcp_ip", 80, 0.92, 5.5, 0.5, 5.0, 1.6, -1.5, 1.2, 300),
+    ("IRC", "tcp_ip", 6667, 0.08, 5.8, 1.0, 6.5, 1.2, 2.5, 1.5, 90),
+]
+
+# Share of the flows that send nothing in one or other direction.
+_EMPTY_SOURCE_RATIO = 0.03
+_EMPTY_DESTINATION_RATIO = 0.08
+# Largest payload kept in a flow, in bytes, as the ISCX payloads are
+# truncated.
+_MAX_PAYLOAD = 384
+_DAY_START = np.datetime64("2010-06-15T00:00:00", "s")
+_DAY_SECONDS = 24 * 60 * 60
+# Part of the day that the attack runs in, in seconds from midnight.
+_ATTACK_WINDOW = (13 * 60 * 60, 20 * 60 * 60)
+_DIRECTIONS = ["L2R", "R2L", "L2L", "R2R"]
+_DIRECTION_WEIGHTS = [0.80, 0.12, 0.06, 0.02]
+_TCP_FLAGS = ["F;S;P;A", "S;P;A", "F;P;A", "F;A", "P;A", "S", "R;A",
+              "F;S;R;P;A"]
+_TCP_FLAG_WEIGHTS = [0.40, 0.15, 0.15, 0.10, 0.08, 0.05, 0.05, 0.02]
+# Decoded text of the payloads of each application, already escaped
+# for XML. Applications not listed get binary looking text.
+_UTF_PAYLOADS = {
+    "HTTPWeb": ["GET / HTTP/1.1&#13;&#10;Host: www.example.com&#13;&#10;",
+                "HTTP/1.1 200 OK&#13;&#10;Content-Type: text/html&#13;&#10;"
+                "&#13;&#10;&lt;html&gt;"],
+    "HTTPImageTransfer": ["GET /logo.png HTTP/1.1&#13;&#10;",
+                          "HTTP/1.1 200 OK&#13;&#10;Content-Type: "
+                          "image/png&#13;&#10;"],
+    "SMTP": ["EHLO mail.example.com&#13;&#10;MAIL FROM:"
+             "&lt;user@example.com&gt;&#13;&#10;"],
+    "IMAP": ["a001 LOGIN user password&#13;&#10;"],
+    "POP": ["USER user&#13;&#10;PASS password&#13;&#10;"],
+    "FTP": ["USER anonymous&#13;&#10;PASS guest@&#13;&#10;"],
+    "IRC": ["NICK bot&#13;&#10;JOIN #channel&#13;&#10;",
+            "PRIVMSG #channel :hello&#13;&#10;"],
+    "SSH": ["SSH-2.0-OpenSSH_5.3&#13;&#10;"],
+}
+_BINARY_PAYLOADS = ["..E..&lt;.@.@.", "....P.&amp;...A.."]
+_PAYLOAD_POOL_SIZE = 1 << 16
+
+
+class SyntheticFlows:
+    """Makes synthetic ISCX flows in chunks.
+    """
+
+    def __init__(self, num_flows, attack_ratio=0.1, seed=None,
+                 payloads=True, chunk_size=16384):
+        """Initialise.
+
+        :param num_flows: The number of flows to make.
+        :param attack_ratio: Chance of each flow being an attack.
+        :param seed: Seed of the random number generator, None for a
+        different set of flows each time.
+        :param payloads: True to fill in the payload elements, False to
+        leave them empty, which makes a much smaller file.
+        :param chunk_size: The number of flows to make at a time.
+        """
+        if num_flows < 0:
+            raise ValueError("The number of flows cannot be negative: "
+                             "{0}".format(num_flows))
+        if not 0.0 <= attack_ratio <= 1.0:
+            raise ValueError("The attack ratio must be between 0 and 1: "
+                             "{0}".format(attack_ratio))
+        self._num_flows = num_flows
+        self._attack_ratio = attack_ratio
+        self._rng = np.random.RandomState(seed)
+        self._payloads = payloads
+        self._chunk_size = chunk_size
+        self._payload_pool = base64.b64encode(
+            self._rng.bytes(_PAYLOAD_POOL_SIZE))
+
+    def chunks(self):
+        """Make the flows.
+
+        :return: Generator of dicts of the values of a chunk of flows,
+        keyed by field name. The Tag of each flow is given as a bool
+        array that is True for attacks.
+        """
+        made = 0
+        while made < self._num_flows:
+            size = min(self._chunk_size, self._num_flows-made)
+            yield self._make_chunk(size)
+            made += size
+
+    def write(self, f_out, flow_tag):
+        """Write the flows as an ISCX dataset XML.
+
+        :param f_out: File object to write to.
+        :param flow_tag: Name of the flow elements, such as
+        TestbedTueJun15-1Flows.
+        :return: The number of attack flows written.
+        """
+        num_attack = 0
+        f_out.write("<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+                    "<dataroot xmlns:xsi=\"http://www.w3.org/2001/"
+                    "XMLSchema-instance\">\n")
+        for chunk in self.chunks():
+            num_attack += int(np.count_nonzero(chunk["Tag"]))
+            f_out.write(self._format_chunk(chunk, flow_tag))
+        f_out.write("</dataroot>\n")
+        return num_attack
+
+    def _make_chunk(self, size):
+        """Make a chunk of flows.
+
+        :param size: The number of flows to make.
+        :return: Dict of the values of the flows keyed by field name.
+        """
+        rng = self._rng
+        attack = rng.random_sample(size) < self._attack_ratio
+        chunk = {"Tag": attack}
+        normal_app = rng.choice(len(_NORMAL_APPS), size,
+                                p=_weights(_NORMAL_APPS))
+        attack_app = rng.choice(len(_ATTACK_APPS), size,
+                                p=_weights(_ATTACK_APPS))
+
+        def param(column):
+            return np.where(attack,
+                            _column(_ATTACK_APPS, column)[attack_app],
+                            _column(_NORMAL_APPS, column)[normal_app])
+
+        chunk["appName"] = param(0)
+        chunk["protocolName"] = param(1)
+        dst_port = param(2)
+        random_port = dst_port == 0
+        dst_port[random_port] = rng.randint(1024, 65536,
+                                            np.count_nonzero(random_port))
+        chunk["destinationPort"] = dst_port
+        chunk["sourcePort"] = rng.randint(1024, 65536, size)
+        src_bytes = _lognormal(rng, param(4), param(5))
+        src_bytes[rng.random_sample(size) < _EMPTY_SOURCE_RATIO] = 0
+        dst_bytes = _lognormal(rng, param(6), param(7))
+        dst_bytes[rng.random_sample(size) < _EMPTY_DESTINATION_RATIO] = 0
+        # Attack floods often get no answer at all.
+        dst_bytes[attack & (rng.random_sample(size) < 0.4)] = 0
+        packet_size = param(10)
+        chunk["totalSourceBytes"] = src_bytes
+        chunk["totalDestinationBytes"] = dst_bytes
+        chunk["totalSourcePackets"] = _packets(rng, src_bytes, packet_size)
+        chunk["totalDestinationPackets"] = _packets(rng, dst_bytes,
+                                                    packet_size)
+        start = np.where(
+            attack, rng.randint(_ATTACK_WINDOW[0], _ATTACK_WINDOW[1], size),
+            rng.randint(0, _DAY_SECONDS, size))
+        duration = np.minimum(np.floor(np.exp(rng.normal(
+            param(8).astype(float), param(9).astype(float)))),
+            _DAY_SECONDS).astype(np.int64)
+        chunk["startDateTime"] = _timestamps(start)
+        chunk["stopDateTime"] = _timestamps(start + duration)
+        chunk["direction"] = np.array(_DIRECTIONS)[rng.choice(
+            len(_DIRECTIONS), size, p=_DIRECTION_WEIGHTS)]
+        chunk["source"], chunk["destination"] = self._addresses(attack)
+        tcp = chunk["protocolName"] == "tcp_ip"
+        for field in ("sourceTCPFlagsDescription",
+                      "destinationTCPFlagsDescription"):
+            flags = np.array(_TCP_FLAGS, dtype=object)[rng.choice(
+                len(_TCP_FLAGS), size, p=_TCP_FLAG_WEIGHTS)]
+            flags[~tcp] = "N/A"
+            chunk[field] = flags
+        for prefix, num_bytes in (("source", src_bytes),
+                                  ("destination", dst_bytes)):
+            b64, utf = self._payloads_of(num_bytes, chunk["appName"])
+            chunk[prefix+"PayloadAsBase64"] = b64
+            chunk[prefix+"PayloadAsUTF"] = utf
+        return chunk
+
+    def _addresses(self, attack):
+        """Make the source and destination addresses of flows.
+
+        Normal flows are between hosts of the testbed network and
+        servers outside it. Attack flows go from the bots to the web
+        server that is the target of the attack.
+
+        :param attack: Bool array that is True for attack flows.
+        :return: Lists of the source and destination addresses.
+        """
+        rng = self._rng
+        size = len(attack)
+        subnets = np.where(attack, 2, rng.randint(1, 7, size)).tolist()
+        hosts = rng.randint(1, 255, size).tolist()
+        servers = rng.randint(1, 255, (size, 4)).tolist()
+        octets = [str(i) for i in range(256)]
+        sources = ["192.168." + octets[subnet] + "." + octets[host] for
+                   subnet, host in zip(subnets, hosts)]
+        destinations = [".".join([octets[i] for i in server]) for server
+                        in servers]
+        for i in np.flatnonzero(attack):
+            destinations[i] = "192.168.5.122"
+        return sources, destinations
+
+    def _payloads_of(self, num_bytes, app_names):
+        """Make the payloads of flows.
+
+        The Base64 payloads are slices of a pool of random bytes and the
+        text payloads are picked from a few typical messages of the
+        application of the flow.
+
+        :param num_bytes: Array of the bytes sent in one direction of
+        each flow.
+        :param app_names: Array of the application of each flow.
+        :return: Lists of the Base64 and text payloads.
+        """
+        size = len(num_bytes)
+        if not self._payloads:
+            return [""] * size, [""] * size
+        rng = self._rng
+        lengths = (np.minimum(num_bytes, _MAX_PAYLOAD) + 2) // 3 * 4
+        offsets = rng.randint(0, len(self._payload_pool)-4*_MAX_PAYLOAD,
+                              size) // 4 * 4
+        texts = rng.randint(0, 1 << 16, size)
+        pool = self._payload_pool
+        b64 = []
+        utf = []
+        for i in range(size):
+            if lengths[i] == 0:
+                b64.append("")
+                utf.append("")
+            else:
+                b64.append(pool[offsets[i]:offsets[i]+lengths[i]])
+                choices = _UTF_PAYLOADS.get(app_names[i], _BINARY_PAYLOADS)
+                utf.append(choices[texts[i] % len(choices)])
+        return b64, utf
+
+    def _format_chunk(self, chunk, flow_tag):
+        """Format a chunk of flows as XML.
+
+        :param chunk: Dict of the values of the flows keyed by field
+        name.
+        :param flow_tag: Name of the flow elements.
+        :return: The flows as a string, one per line.
+        """
+        tags = np.where(chunk["Tag"], "Attack", "Normal")
+        parts = ["<{0}>".format(flow_tag)]
+        columns = []
+        for field in FIELDS:
+            values = tags if field == "Tag" else chunk[field]
+            if isinstance(values, np.ndarray):
+                values = values.tolist()
+            if field in ("sourcePayloadAsBase64",
+                         "destinationPayloadAsBase64"):
+                # Empty payloads are written as empty elements, as in
+                # the ISCX files.
+                start, end = "<{0}>".format(field), "</{0}>".format(field)
+                values = [start + v + end if v else "<{0}/>".format(field)
+                          for v in values]
+                parts.append("%s")
+            else:
+                parts.append("<{0}>%s</{0}>".format(field))
+            columns.append(values)
+        parts.append("</{0}>\n".format(flow_tag))
+        template = "".join(parts)
+        return "".join([template % values for values in zip(*columns)])
+
+
+def write_file(file_name, num_flows, attack_ratio=0.1, seed=None,
+               payloads=True):
+    """Write an ISCX dataset XML of synthetic flows.
+
+    The flows are named after the file, as in the ISCX files.
+
+    :param file_name: Name of the XML file to write.
+    :param num_flows: The number of flows to write.
+    :param attack_ratio: Chance of each flow being an attack.
+    :param seed: Seed of the random number generator.
+    :param payloads: True to fill in the payload elements.
+    :return: The number of attack flows written.
+    """
+    flows = SyntheticFlows(num_flows, attack_ratio, seed, payloads)
+    flow_tag = path.splitext(path.basename(file_name))[0]
+    with open(file_name, mode="wb") as f_out:
+        return flows.write(f_out, flow_tag)
+
+
+def _weights(apps):
+    """Return the weights of applications as probabilities.
+
+    :param apps: List of application tuples.
+    :return: float64 array that sums to 1.
+    """
+    weights = _column(apps, 3).astype(float)
+    return weights / weights.sum()
+
+
+def _column(apps, column):
+    """Return a column of a table of applications.
+
+    :param apps: List of application tuples.
+    :param column: Index of the column.
+    :return: NumPy array of the column.
+    """
+    return np.array([app[column] for app in apps])
+
+
+def _lognormal(rng, mean, sigma):
+    """Draw whole numbers of bytes from log-normal distributions.
+
+    :param rng: RandomState to draw with.
+    :param mean: Array of the mean of the log of each value.
+    :param sigma: Array of the standard deviation of the log of each
+    value.
+    :return: int64 array.
+    """
+    values = np.exp(rng.normal(mean.astype(float), sigma.astype(float)))
+    return np.minimum(np.floor(values), 1 << 40).astype(np.int64)
+
+
+def _packets(rng, num_bytes, packet_size):
+    """Draw the number of packets that carried some bytes.
+
+    :param rng: RandomState to draw with.
+    :param num_bytes: Array of the bytes sent.
+    :param packet_size: Array of the mean bytes per packet.
+    :return: int64 array, at least 1 where bytes were sent.
+    """
+    sizes = packet_size * np.exp(rng.normal(0.0, 0.4, len(num_bytes)))
+    packets = np.ceil(num_bytes / np.maximum(sizes, 40.0)).astype(np.int64)
+    # Flows that carry no data may still have handshake packets.
+    empty = num_bytes == 0
+    packets[empty] = rng.randint(0, 3, np.count_nonzero(empty))
+    return np.minimum(packets, np.iinfo(np.uint32).max)
+
+
+def _timestamps(seconds):
+    """Format times of the day of the dataset as ISCX timestamps.
+
+    :param seconds: Array of the seconds since the start of the day.
+    :return: Array of strings such as 2010-06-15T04:53:31.
+    """
+    return (_DAY_START + seconds.astype("timedelta64[s]")).astype(str)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write synthetic flows as ISCX 2012 IDS dataset "
+                    "XMLs.")
+    parser.add_argument("output", nargs="+", metavar="OUTPUT_XML",
+                        help="file to write, such as "
+                             "TestbedTueJun15-1Flows.xml")
+    parser.add_argument("--flows", type=int, default=10000,
+                        help="number of flows in each file "
+                             "(default: 10000)")
+    parser.add_argument("--attack-ratio", type=float, default=0.1,
+                        help="chance of a flow being an attack "
+                             "(default: 0.1)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the first file, the seed of each "
+                             "file after it is one more")
+    parser.add_argument("--no-payloads", action="store_true",
+                        help="leave the payload elements empty")
+    args = parser.parse_args()
+    for i in range(len(args.output)):
+        seed = None if args.seed is None else args.seed + i
+        try:
+            num_attack = write_file(args.output[i], args.flows,
+                                    args.attack_ratio, seed,
+                                    not args.no_payloads)
+        except (IOError, ValueError) as err:
+            print("Unable to write {0}: {1}".format(args.output[i], err))
+            sys.exit(-1)
+        print("Wrote {0} flows ({1} attacks) to: {2}".format(
+            args.flows, num_attack, args.output[i]))
@@ -0,0 +1,494 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run the tests of an experiment, in parallel if there are enough
+workers.
+"""
+
+from classifiers.iscx_fold_view import FoldView
+import classifiers.iscx_fold_runner as fold_runner
+from data.iscx_shared_dataset import SharedDataset
+import profiling
+from task_costs import TaskCosts, longest_first, makespan
+import tracing
+
+from collections import namedtuple
+from multiprocessing import Pool
+import Queue
+import time
+import traceback
+
+import numpy as np
+
+__author__ = "Jarrod N. Bakker"
+
+
+# A single unit of work: run some classifiers on one fold of one trial
+# of a feature set.
+ExperimentTask = namedtuple("ExperimentTask", ["features", "classifiers",
+                                               "trial_num", "fold_num"])
+
+# State used by run_task() in the process that runs it.
+_worker_state = {}
+
+
+class ExperimentScheduler:
+    """Breaks the grid of feature sets, classifiers, trials and folds
+    into tasks and runs them on a pool of processes.
+
+    The most costly tasks are started first so that the run does not
+    end with one long task holding everything up. The results of each
+    task are handed back to a single writer as soon as the task is
+    done, so little is lost if the run is stopped. The writer puts the
+    rows back into the order of a serial run, see SerialOrder.
+    """
+
+    def __init__(self, features_set, labels, fold_plan, classifiers,
+                 classifier_config, workers=1, fold_major=False,
+                 completed=None, cost_file=None, coordinator=None):
+        """Initialise.
+
+        :param features_set: Dict of LazyFeatureSet objects. Each feature
+        set is released once it is no longer needed.
+        :param labels: Labels indicating if a flow is normal or attack.
+        :param fold_plan: FoldPlan of the folds of each trial.
+        :param classifiers: List of the classifier classes to test.
+        :param classifier_config: Dict of config information for
+        classifiers.
+        :param workers: Number of processes to run the tasks in.
+        :param fold_major: True to run every classifier on a fold in
+        one task so that the fold is only gathered once, False for one
+        task per classifier.
+        :param completed: Set of the units that are already done, as
+        tuples of the classifier name, feature set name, trial number
+        and fold number. They are left out of the tasks.
+        :param cost_file: Name of the file to keep the measured cost
+        of the tasks in, None to not keep them between runs.
+        :param coordinator: GridCoordinator to serve the tasks to remote
+        workers with, None to run them on this host.
+        """
+        self._features_set = features_set
+        self._labels = labels
+        self._fold_plan = fold_plan
+        self._classifiers = classifiers
+        self._classifier_config = classifier_config
+        self._workers = workers
+        self._fold_major = fold_major
+        self._completed = completed or set()
+        self._costs = TaskCosts(cost_file)
+        self._coordinator = coordinator
+        # Start time, predicted makespan and number of tasks
+        self._prediction = None
+
+    def get_tasks(self):
+        """Return the tasks of the experiment.
+
+        :return: List of ExperimentTask in the order that a serial run
+        would carry them out.
+        """
+        names = [cls.NAME for cls in self._classifiers]
+        if self._fold_major:
+            groups = [tuple(names)]
+        else:
+            groups = [(name,) for name in names]
+        tasks = []
+        for features in self._features_set:
+            for trial_num in range(1, self._fold_plan.get_num_trials()+1):
+                for fold_num in range(1, self._fold_plan.get_num_folds()+1):
+                    for group in groups:
+                        todo = tuple([name for name in group if
+                                      (name, features, trial_num,
+                                       fold_num) not in self._completed])
+                        if todo:
+                            tasks.append(ExperimentTask(
+                                features, todo, trial_num, fold_num))
+        return tasks
+
+    def run(self):
+        """Run the tasks of the experiment.
+
+        :return: Generator of the results of each task as it finishes,
+        as tuples of the classifier name, feature set name, trial number
+        and a list of the results of the folds that were run.
+        """
+        tasks = self.get_tasks()
+        state = {"classifiers": dict([(cls.NAME, cls) for cls in
+                                      self._classifiers]),
+                 "classifier_config": self._classifier_config,
+                 "trace_file": tracing.get_file_name(),
+                 "trace_memory": tracing.is_tracing_memory(),
+                 "profile": profiling.get_config()}
+        pool = None
+        shared = None
+        local = self._coordinator is None and self._workers < 2
+        try:
+            if self._coordinator is not None:
+                # The workers load the data themselves.
+                self._coordinator.start()
+                results = self._dispatch(self._coordinator, tasks)
+            elif local:
+                state["dataset"] = LocalDataset(self._features_set,
+                                                self._labels, self._fold_plan)
+                init_worker(state)
+                self._predict(tasks, range(len(tasks)), time.time())
+                results = (run_task((i, tasks[i])) for i in
+                           range(len(tasks)))
+            else:
+                # The workers memory-map the data rather than each holding
+                # a copy of it.
+                needed = set([task.features for task in tasks])
+                shared = SharedDataset.publish(
+                    dict([(name, self._features_set[name]) for name in
+                          needed]), self._labels, self._fold_plan)
+                state["dataset"] = shared
+                pool = Pool(processes=self._workers, initializer=init_worker,
+                            initargs=(state,))
+                results = self._dispatch(_PoolRunner(pool), tasks)
+            print("Running {0} tasks.".format(len(tasks)))
+            for i, task_results, times in results:
+                task = tasks[i]
+                for name, seconds in zip(task.classifiers, times):
+                    self._costs.record(name, task.features, seconds)
+                # Hand back the results as soon as the task is done so
+                # that they can be written and recorded in the manifest.
+                for name, row in zip(task.classifiers, task_results):
+                    yield name, task.features, task.trial_num, [row]
+                if local and (i+1 == len(tasks) or
+                              tasks[i+1].features != task.features):
+                    self._features_set[task.features].release()
+                    _worker_state["fold_view"] = None
+            self._report_makespan()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if shared is not None:
+                shared.remove()
+            if self._coordinator is not None:
+                self._coordinator.close()
+            _worker_state.clear()
+            self._costs.save()
+
+    def _dispatch(self, runner, tasks):
+        """Run tasks on a pool of workers, most costly first.
+
+        Tasks of a classifier and feature set whose cost is not known
+        yet are probed first: one such task is run for each of them
+        and its time is used to cost the others. Only a few more tasks
+        than there are workers are started ahead, so the tasks that are
+        left are ranked again as soon as the cost of a probe is known.
+
+        :param runner: Object with a submit() method taking a task index
+        and an ExperimentTask to start, and a next_result() method
+        returning the task index, results and time taken by each
+        classifier of the next task to finish.
+        :param tasks: List of ExperimentTask to run.
+        :return: Generator of the task index, results and time taken by
+        each classifier, in the order that the tasks finish.
+        """
+        probed = set()
+        unknown = set()  # Classifiers and feature sets without a cost
+        order = self._rank(tasks, range(len(tasks)), probed, unknown)
+        next_task = 0
+        running = 0
+        while next_task < len(order) or running:
+            while next_task < len(order) and running < self._get_slots():
+                runner.submit(order[next_task], tasks[order[next_task]])
+                next_task += 1
+                running += 1
+            result = runner.next_result()
+            running -= 1
+            yield result
+            # The cost of the task has been recorded by now.
+            learned = [key for key in unknown if
+                       self._costs.get(*key) is not None]
+            if learned:
+                unknown.difference_update(learned)
+                order = self._rank(tasks, order[next_task:], probed,
+                                   unknown)
+                next_task = 0
+
+    def _rank(self, tasks, indices, probed, unknown):
+        """Order tasks that have not been started yet.
+
+        :param tasks: List of ExperimentTask.
+        :param indices: List of the indices of the tasks to order.
+        :param probed: Set of the classifiers and feature sets whose
+        cost is being probed, which is added to.
+        :param unknown: Set of the classifiers and feature sets whose
+        cost is not known, which is added to.
+        :return: List of the indices in the order to start them: probes
+        first and then the rest from the most to the least costly, with
+        those of unknown cost last.
+        """
+        probes = []
+        rest = []
+        for i in indices:
+            keys = set([(name, tasks[i].features) for name in
+                        tasks[i].classifiers if
+                        self._costs.get(name, tasks[i].features) is None])
+            unknown.update(keys)
+            if keys - probed:
+                probes.append(i)
+                probed.update(keys)
+            else:
+                rest.append(i)
+        if probes:
+            print("Probing the cost of {0} tasks.".format(len(probes)))
+        costs = [self._costs.predict(tasks[i]) or 0.0 for i in rest]
+        order = probes + [rest[j] for j in longest_first(costs)]
+        if not unknown:
+            self._predict(tasks, order, time.time())
+        return order
+
+    def _get_slots(self):
+        """Return how many tasks to keep started at once.
+
+        :return: Number of tasks, twice the number of workers so that a
+        worker never waits for its next task.
+        """
+        if self._coordinator is not None:
+            return 2 * max(self._coordinator.get_num_workers(), 1)
+        return 2 * self._workers
+
+    def _predict(self, tasks, order, start):
+        """Predict the makespan of tasks started in the given order.
+
+        :param tasks: List of ExperimentTask.
+        :param order: List of the indices of the tasks in the order that
+        they are started.
+        :param start: Time that the first of the tasks started.
+        """
+        costs = [self._costs.predict(tasks[i]) for i in order]
+        if None in costs:
+            self._prediction = None
+            return
+        if self._coordinator is not None:
+            workers = self._coordinator.get_num_workers()
+        else:
+            workers = self._workers
+        predicted = makespan(costs, max(workers, 1))
+        self._prediction = (start, predicted, len(costs))
+        print("Predicted makespan of {0} tasks: {1:.1f}s.".format(
+            len(costs), predicted))
+
+    def _report_makespan(self):
+        """Print the predicted and the actual makespan of the tasks.
+        """
+        if self._prediction is None:
+            return
+        start, predicted, num_tasks = self._prediction
+        print("Makespan of {0} tasks: predicted {1:.1f}s, actual "
+              "{2:.1f}s.".format(num_tasks, predicted,
+                                 time.time()-start))
+
+
+class _PoolRunner:
+    """Starts tasks on a process pool one at a time and gives back
+    their results as they finish.
+    """
+
+    def __init__(self, pool):
+        """Initialise.
+
+        :param pool: Pool whose processes were set up by init_worker().
+        """
+        self._pool = pool
+        self._results = Queue.Queue()
+
+    def submit(self, index, task):
+        """Start a task.
+
+        :param index: Index of the task.
+        :param task: ExperimentTask to run.
+        """
+        self._pool.apply_async(_run_pool_task, ((index, task),),
+                               callback=self._results.put)
+
+    def next_result(self):
+        """Wait for a task to finish.
+
+        :return: Tuple of the task index, results and time taken by each
+        classifier.
+        """
+        while True:
+            try:
+                # A timeout lets the wait be interrupted.
+                item = self._results.get(True, 1.0)
+                break
+            except Queue.Empty:
+                pass
+        if item[0] == "error":
+            raise RuntimeError(item[1])
+        return item[1:]
+
+
+class SerialOrder:
+    """The order that a serial run writes the rows of each results file
+    in: by feature set, then trial, then fold. It is the same whether or
+    not the run is fold major, so each row has a fixed position in its
+    file however the tasks are run.
+    """
+
+    def __init__(self, feature_names, num_trials, num_folds):
+        """Initialise.
+
+        :param feature_names: List of the feature set names in the order
+        that they are tested.
+        :param num_trials: Number of trials of each feature set.
+        :param num_folds: Number of folds of each trial.
+        """
+        self._feature_index = dict([(name, i) for i, name in
+                                    enumerate(feature_names)])
+        self._num_trials = num_trials
+        self._num_folds = num_folds
+
+    def get_position(self, features, trial_num, fold_num):
+        """Return the position of the row of a fold in its results file,
+        counting from 0 for the first row of the run.
+
+        :param features: Name of the feature set.
+        :param trial_num: Number of the trial.
+        :param fold_num: Number of the fold.
+        :return: Position as an integer.
+        """
+        return ((self._feature_index[features]*self._num_trials +
+                 trial_num-1)*self._num_folds + fold_num-1)
+
+
+class LocalDataset:
+    """The data of a run as held by the process running the tests, with
+    the same interface as SharedDataset.
+    """
+
+    def __init__(self, features_set, labels, fold_plan):
+        """Initialise.
+
+        :param features_set: Dict of LazyFeatureSet objects.
+        :param labels: Array of the label of each flow.
+        :param fold_plan: FoldPlan of the folds of each trial.
+        """
+        self._features_set = features_set
+        self._labels = labels
+        self._fold_labels = None
+        self._fold_plan = fold_plan
+
+    def get_feature_set(self, name):
+        """Return a feature set.
+
+        :param name: Name of the feature set.
+        :return: float32 matrix with one row per flow.
+        """
+        return self._features_set[name].get()
+
+    def get_labels(self):
+        """Return the labels.
+
+        :return: int8 array.
+        """
+        return self._labels
+
+    def get_fold_labels(self):
+        """Return the labels as FoldView gathers them.
+
+        :return: float32 array, converted once.
+        """
+        if self._fold_labels is None:
+            self._fold_labels = np.ascontiguousarray(self._labels,
+                                                     dtype=FoldView.DTYPE)
+        return self._fold_labels
+
+    def get_fold_plan(self):
+        """Return the fold plan.
+
+        :return: FoldPlan object.
+        """
+        return self._fold_plan
+
+
+def init_worker(state):
+    """Set up the state of a process that runs tasks.
+
+    :param state: Dict of the dataset, the classifier classes by name,
+    the classifier config, the file to trace to (None to not write the
+    trace out), whether to trace memory and the arguments to profile
+    with (None to not profile).
+    """
+    _worker_state.clear()
+    _worker_state.update(state)
+    if state.get("trace_file") is not None or state.get("trace_memory"):
+        tracing.enable(state.get("trace_file"),
+                       memory=state.get("trace_memory", False))
+    if state.get("profile") is not None:
+        profiling.enable(*state["profile"])
+    _worker_state["fold_plan"] = state["dataset"].get_fold_plan()
+    # Feature set name and FoldView of the feature set of the last task
+    _worker_state["fold_view"] = None
+
+
+def run_task(indexed_task):
+    """Run a task of the experiment.
+
+    :param indexed_task: Tuple of the index of the task and the
+    ExperimentTask to run.
+    :return: Tuple of the index of the task, a list of the results of
+    the fold for each classifier in the task and a list of the time
+    each classifier took in seconds.
+    """
+    i, task = indexed_task
+    state = _worker_state
+    with tracing.span("task", features=task.features,
+                      trial=task.trial_num, fold=task.fold_num):
+        if state["fold_view"] is None or \
+                state["fold_view"][0] != task.features:
+            # Only the FoldView, and its buffers, of the feature set of
+            # the last task is kept. The matrix and labels are not
+            # copied, so a new view only costs its buffers. The old view
+            # is dropped before the new one is made.
+            state["fold_view"] = None
+            state["fold_view"] = (task.features, FoldView(
+                state["dataset"].get_feature_set(task.features),
+                state["dataset"].get_fold_labels()))
+        skf = state["fold_plan"].get_folds(task.trial_num-1)
+        train, test = skf.get_fold(task.fold_num-1)
+        fold = fold_runner.gather_fold(state["fold_view"][1], train, test)
+        results = []
+        times = []
+        for name in task.classifiers:
+            with tracing.span("classify", classifier=name,
+                              fold=task.fold_num):
+                start = time.time()
+                cls = state["classifiers"][name](state["classifier_config"])
+                with profiling.profile("classify", task.fold_num,
+                                       classifier=name,
+                                       features=task.features,
+                                       trial=task.trial_num):
+                    results.append(cls.classify_fold(task.fold_num, *fold))
+                times.append(time.time()-start)
+    return i, results, times
+
+
+def _run_pool_task(indexed_task):
+    """Run a task in a pool process.
+
+    :param indexed_task: Tuple of the index of the task and the
+    ExperimentTask to run.
+    :return: Tuple of "result" and what run_task() returned, or of
+    "error" and a message if the task failed.
+    """
+    try:
+        return ("result",) + run_task(indexed_task)
+    except Exception:
+        return ("error", "Task {0} failed:\n{1}".format(
+            indexed_task[0], traceback.format_exc()))
@@ -0,0 +1,387 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Run the tests of an experiment on several hosts.
+
+A coordinator serves the tasks of the experiment over TCP. Workers on
+any number of hosts connect to it, load the data set from their own
+copy of it, and run tasks until there are none left. Workers send a
+heartbeat while they are busy, and every task of a worker that dies or
+falls silent is handed to another worker.
+"""
+
+from experiment_scheduler import ExperimentTask, LocalDataset, \
+    init_worker, run_task
+import profiling
+import tracing
+
+from collections import deque
+from multiprocessing.connection import Client, Listener
+from multiprocessing import AuthenticationError
+import os
+import Queue
+import socket
+import threading
+import time
+import traceback
+
+__author__ = "Jarrod N. Bakker"
+
+
+class GridCoordinator:
+    """Serves tasks to GridWorker processes and gathers their results.
+
+    Each worker is served by its own thread. A worker is sent one task
+    at a time and sends back its results before it is sent another.
+    """
+
+    # A task is given up on after it has failed this many times.
+    _MAX_ATTEMPTS = 3
+    # A worker is treated as lost if nothing, not even a heartbeat, is
+    # heard from it for this long, in seconds.
+    _WORKER_TIMEOUT = 60.0
+    # How long to wait for the workers to be told that the run is
+    # over, in seconds.
+    _CLOSE_TIMEOUT = 10.0
+
+    def __init__(self, address, authkey, run_info):
+        """Initialise.
+
+        :param address: Tuple of the host and port to listen on.
+        :param authkey: Key that workers must know to connect.
+        :param run_info: Dict describing the run, which workers use to
+        check that they have the same data. It holds the number of
+        folds, the seeds, the labels hash, the feature set names and
+        the classifier config.
+        """
+        self._address = address
+        self._authkey = authkey
+        self._run_info = run_info
+        self._listener = None
+        self._cond = threading.Condition()
+        self._todo = deque()  # Tuples of a task index and ExperimentTask
+        self._attempts = {}
+        self._results = Queue.Queue()
+        self._num_workers = 0
+        self._threads = []
+        self._closed = False
+
+    def start(self):
+        """Start listening for workers.
+        """
+        self._listener = Listener(self._address, authkey=self._authkey)
+        print("Coordinator listening on {0}:{1}.".format(*self._address))
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def submit(self, index, task):
+        """Queue a task to be handed out to the workers.
+
+        :param index: Index of the task.
+        :param task: ExperimentTask to run.
+        """
+        with self._cond:
+            self._todo.append((index, task))
+            self._cond.notify()
+
+    def next_result(self):
+        """Wait for a task to finish.
+
+        :return: Tuple of the task index, results and time taken by each
+        classifier.
+        """
+        while True:
+            try:
+                # A timeout lets the wait be interrupted.
+                item = self._results.get(True, 1.0)
+                break
+            except Queue.Empty:
+                pass
+        if item[0] == "error":
+            raise RuntimeError(item[1])
+        return item[1:]
+
+    def get_num_workers(self):
+        """Return the number of workers that are ready.
+
+        :return: Number as an integer.
+        """
+        return self._num_workers
+
+    def close(self):
+        """Tell the workers that there are no more tasks and stop
+        listening.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        # Workers that are idle are sent "done" by their threads. The
+        # threads of busy workers are left behind if the run is stopping
+        # because of an error.
+        give_up = time.time() + self._CLOSE_TIMEOUT
+        for thread in self._threads:
+            thread.join(max(give_up-time.time(), 0.0))
+
+    def _accept(self):
+        """Accept workers until the coordinator is closed.
+        """
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as err:
+                print("Rejected a worker: {0}".format(err))
+                continue
+            except (IOError, EOFError, AttributeError):
+                return  # The listener was closed
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _serve(self, conn):
+        """Serve tasks to a worker until there are none left or the
+        worker is lost.
+
+        :param conn: Connection to the worker.
+        """
+        name = "unknown worker"
+        task = None
+        ready = False
+        try:
+            name = "{0} (pid {1})".format(*self._recv(conn)[1:])
+            conn.send(("run", self._run_info))
+            reply = self._recv(conn)
+            if reply[0] != "ready":
+                print("Worker {0} could not join: {1}".format(name,
+                                                             reply[1]))
+                return
+            ready = True
+            with self._cond:
+                self._num_workers += 1
+            print("Worker {0} joined.".format(name))
+            while True:
+                task = self._next_task()
+                if task is None:
+                    conn.send(("done",))
+                    return
+                conn.send(("task", task[0], tuple(task[1])))
+                reply = self._recv(conn)
+                if reply[0] == "result":
+                    self._results.put(reply)
+                else:
+                    self._retry(task, "Task {0} failed on worker {1}:\n"
+                                      "{2}".format(task[0], name, reply[2]))
+                task = None
+        except (IOError, EOFError) as err:
+            print("Lost worker {0}: {1}".format(name, err))
+            if task is not None:
+                self._retry(task, "Task {0} was lost with worker "
+                                  "{1}.".format(task[0], name))
+        finally:
+            if ready:
+                with self._cond:
+                    self._num_workers -= 1
+            conn.close()
+
+    def _recv(self, conn):
+        """Wait for a message from a worker, skipping heartbeats.
+
+        :param conn: Connection to the worker.
+        :return: The message.
+        """
+        while True:
+            if not conn.poll(self._WORKER_TIMEOUT):
+                raise IOError("Nothing heard from it for {0} "
+                              "seconds.".format(self._WORKER_TIMEOUT))
+            msg = conn.recv()
+            if msg[0] != "heartbeat":
+                return msg
+
+    def _next_task(self):
+        """Wait for a task to hand out.
+
+        :return: Tuple of a task index and ExperimentTask, or None once
+        the coordinator is closed.
+        """
+        with self._cond:
+            while not self._todo and not self._closed:
+                self._cond.wait(1.0)
+            if self._closed:
+                return None
+            return self._todo.popleft()
+
+    def _retry(self, task, reason):
+        """Put a task that did not finish back at the front of the
+        queue, or give up on the run if it has failed too often.
+
+        :param task: Tuple of a task index and ExperimentTask.
+        :param reason: Why the task did not finish.
+        """
+        print(reason)
+        with self._cond:
+            self._attempts[task[0]] = self._attempts.get(task[0], 0) + 1
+            if self._attempts[task[0]] >= self._MAX_ATTEMPTS:
+                self._results.put(("error", "Giving up on task {0} after "
+                                            "{1} attempts.".format(
+                                             task[0], self._MAX_ATTEMPTS)))
+                return
+            self._todo.appendleft(task)
+            self._cond.notify()
+
+
+class GridWorker:
+    """Runs the tasks served by a GridCoordinator.
+    """
+
+    # How long to keep trying to reach the coordinator for, in seconds.
+    _CONNECT_TIMEOUT = 300
+    # How often to tell the coordinator that the worker is alive, in
+    # seconds. This must be well under GridCoordinator._WORKER_TIMEOUT.
+    _HEARTBEAT_INTERVAL = 10.0
+
+    def __init__(self, address, authkey, classifiers):
+        """Initialise.
+
+        :param address: Tuple of the host and port of the coordinator.
+        :param authkey: Key needed to connect to the coordinator.
+        :param classifiers: List of the classifier classes that tasks
+        may name.
+        """
+        self._address = address
+        self._authkey = authkey
+        self._classifiers = classifiers
+        # Heartbeats are sent from another thread.
+        self._send_lock = threading.Lock()
+
+    def run(self, prepare):
+        """Connect to the coordinator and run tasks until there are
+        none left.
+
+        :param prepare: Callable taking the number of folds and the
+        seeds of the run and returning a dict of LazyFeatureSet
+        objects, the labels and the FoldPlan of the run.
+        :return: True if the worker ran until the end of the run, False
+        otherwise.
+        """
+        conn = self._connect()
+        if conn is None:
+            return False
+        # Loading the data and running a task can both take a long
+        # time, so the coordinator is told that the worker is alive
+        # until the run is over.
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._send_heartbeats,
+                                     args=(conn, stop))
+        heartbeat.daemon = True
+        heartbeat.start()
+        try:
+            self._send(conn, ("hello", socket.gethostname(), os.getpid()))
+            run_info = conn.recv()[1]
+            features_set, labels, fold_plan = prepare(
+                run_info["num_folds"], run_info["seeds"])
+            error = None
+            missing = set(run_info["feature_sets"]) - set(features_set)
+            if fold_plan.get_labels_hash() != run_info["labels_hash"]:
+                error = "The data set does not match the coordinator's."
+            elif missing:
+                error = "Missing feature sets: {0}".format(
+                    ", ".join(sorted(missing)))
+            if error is not None:
+                print(error)
+                self._send(conn, ("error", error))
+                return False
+            init_worker({"dataset": LocalDataset(features_set, labels,
+                                                 fold_plan),
+                         "classifiers": dict([(cls.NAME, cls) for cls in
+                                              self._classifiers]),
+                         "classifier_config": run_info[
+                             "classifier_config"],
+                         "trace_file": tracing.get_file_name(),
+                         "trace_memory": run_info.get("trace_memory",
+                                                      False),
+                         "profile": profiling.get_config()})
+            self._send(conn, ("ready",))
+            while True:
+                msg = conn.recv()
+                if msg[0] == "done":
+                    return True
+                try:
+                    result = run_task((msg[1], ExperimentTask(*msg[2])))
+                except Exception:
+                    self._send(conn, ("failed", msg[1],
+                                      traceback.format_exc()))
+                    continue
+                self._send(conn, ("result",) + result)
+        except (IOError, EOFError) as err:
+            print("Lost the coordinator: {0}".format(err))
+            return False
+        finally:
+            stop.set()
+            heartbeat.join()
+            conn.close()
+
+    def _send(self, conn, msg):
+        """Send a message to the coordinator.
+
+        :param conn: Connection to the coordinator.
+        :param msg: Tuple to send.
+        """
+        with self._send_lock:
+            conn.send(msg)
+
+    def _send_heartbeats(self, conn, stop):
+        """Send heartbeats to the coordinator until told to stop.
+
+        :param conn: Connection to the coordinator.
+        :param stop: Event that is set once the worker is finished.
+        """
+        while not stop.wait(self._HEARTBEAT_INTERVAL):
+            try:
+                self._send(conn, ("heartbeat",))
+            except (IOError, EOFError):
+                return  # run() finds out that the connection is lost
+
+    def _connect(self):
+        """Connect to the coordinator, waiting for it to start if
+        needed.
+
+        :return: Connection to the coordinator, or None if it could not
+        be reached.
+        """
+        give_up = time.time() + self._CONNECT_TIMEOUT
+        while True:
+            try:
+                return Client(self._address, authkey=self._authkey)
+            except (IOError, EOFError) as err:
+                if time.time() > give_up:
+                    print("Unable to reach the coordinator at {0}:{1}: "
+                          "{2}".format(self._address[0], self._address[1],
+                                       err))
+                    return None
+            time.sleep(1.0)
+
+
+def parse_address(address, default_host="localhost"):
+    """Parse an address given as [HOST:]PORT.
+
+    :param address: Address as a string.
+    :param default_host: Host to use if the address has none.
+    :return: Tuple of the host and port.
+    """
+    host, sep, port = address.rpartition(":")
+    return host or default_host, int(port)
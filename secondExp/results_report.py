@@ -0,0 +1,158 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Report the mean, standard deviation and confidence interval of the
+results of each classifier on each feature set.
+
+Usage: python results_report.py [--store FILE] [--metric NAME ...]
+"""
+
+from results_sink import ResultsDialect
+from results_store import ResultsStore
+
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+
+from scipy import stats
+
+__author__ = "Jarrod N. Bakker"
+
+
+def summarise(store, metrics, confidence=0.95, classifier=None,
+              features=None):
+    """Summarise the results in a store.
+
+    :param store: Open ResultsStore object.
+    :param metrics: List of the names of the columns to summarise.
+    :param confidence: Level of the confidence intervals.
+    :param classifier: Name of a classifier to limit the results to,
+    None for all of them.
+    :param features: Name of a feature set to limit the results to,
+    None for all of them.
+    :return: List of tuples of the classifier, the feature set, the
+    number of folds and a list of the mean, standard deviation and
+    half-width of the confidence interval of each metric.
+    """
+    summary = []
+    for cls_name, fs_name, count, moments in store.aggregate(
+            metrics, classifier, features):
+        t_value = 0.0
+        if count > 1:
+            t_value = stats.t.ppf((1+confidence)/2.0, count-1)
+        stats_list = []
+        for mean, var in moments:
+            std = math.sqrt(var)
+            stats_list.append((mean, std, t_value*std/math.sqrt(count)))
+        summary.append((cls_name, fs_name, count, stats_list))
+    return summary
+
+
+def import_csv(store, file_names):
+    """Load results files into a store.
+
+    :param store: Open ResultsStore object.
+    :param file_names: List of the names of the results files.
+    :return: The number of rows loaded.
+    """
+    num_rows = 0
+    for file_name in file_names:
+        with open(file_name, mode="rb") as f_results:
+            reader = csv.reader(f_results, ResultsDialect)
+            headings = next(reader)
+            if headings != store.get_columns():
+                raise ValueError("Results file {0} has different columns "
+                                 "to the store.".format(file_name))
+            rows = list(reader)
+        store.insert(rows)
+        num_rows += len(rows)
+        print("Loaded {0} rows from: {1}".format(len(rows), file_name))
+    return num_rows
+
+
+def print_summary(summary, metrics, confidence):
+    """Print a summary as a table.
+
+    :param summary: List of tuples as returned by summarise().
+    :param metrics: List of the names of the summarised columns.
+    :param confidence: Level of the confidence intervals.
+    """
+    name_width = max([len("classifier")] + [len(s[0]) for s in summary])
+    fs_width = max([len("features")] + [len(s[1]) for s in summary])
+    header = "{0:<{1}}  {2:<{3}}  {4:>7}".format("classifier", name_width,
+                                                 "features", fs_width,
+                                                 "folds")
+    for metric in metrics:
+        header += "  {0:>{1}}  {2:>10}  {3:>13}".format(
+            metric + " mean", max(len(metric)+5, 10), "std",
+            "{0:g}% CI".format(confidence*100))
+    print(header)
+    for cls_name, fs_name, count, stats_list in summary:
+        line = "{0:<{1}}  {2:<{3}}  {4:>7}".format(cls_name, name_width,
+                                                   fs_name, fs_width,
+                                                   count)
+        for metric, (mean, std, half_width) in zip(metrics, stats_list):
+            line += "  {0:>{1}.6f}  {2:>10.6f}  {3:>13}".format(
+                mean, max(len(metric)+5, 10), std,
+                "+/-{0:.6f}".format(half_width))
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report the results of each classifier on each "
+                    "feature set.")
+    parser.add_argument("--store", default="30-fold_results.sqlite",
+                        help="results store to read "
+                             "(default: %(default)s)")
+    parser.add_argument("--metric", action="append",
+                        help="column to report, may be repeated "
+                             "(default: TP_rate and FP_rate)")
+    parser.add_argument("--classifier", help="only report this classifier")
+    parser.add_argument("--features", help="only report this feature set")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="level of the confidence intervals "
+                             "(default: %(default)s)")
+    parser.add_argument("--import", dest="import_files", nargs="+",
+                        metavar="CSV", help="load results files into the "
+                                            "store before reporting")
+    args = parser.parse_args()
+    metrics = args.metric or ["TP_rate", "FP_rate"]
+    if args.import_files is None and not os.path.isfile(args.store):
+        print("No results store found: {0}".format(args.store))
+        sys.exit(-1)
+    columns = None
+    if args.import_files is not None:
+        with open(args.import_files[0], mode="rb") as f_results:
+            columns = next(csv.reader(f_results, ResultsDialect))
+    results_store = ResultsStore(args.store, columns)
+    try:
+        results_store.open()
+        if args.import_files is not None:
+            import_csv(results_store, args.import_files)
+        start = time.time()
+        summary = summarise(results_store, metrics, args.confidence,
+                            args.classifier, args.features)
+        print_summary(summary, metrics, args.confidence)
+        print("Summarised {0} folds in {1:.3f}s.".format(
+            sum([s[2] for s in summary]), time.time()-start))
+    except (IOError, ValueError) as err:
+        print("Unable to report the results: {0}".format(err))
+        sys.exit(-1)
+    finally:
+        results_store.close()
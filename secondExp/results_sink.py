@@ -0,0 +1,340 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Write the results of a run to the results files of its classifiers.
+"""
+
+import tracing
+
+from cStringIO import StringIO
+import csv
+import datetime
+import os
+import Queue
+import threading
+import time
+import traceback
+
+__author__ = "Jarrod N. Bakker"
+
+
+class ResultsDialect(csv.Dialect):
+    """CSV dialect of the results files.
+
+    Initial spaces are skipped when reading so that results files
+    written with ", " between the values can still be imported into a
+    results store. A run does not append to such files though, see
+    ResultsSink.open().
+    """
+    delimiter = ","
+    quotechar = '"'
+    doublequote = True
+    skipinitialspace = True
+    lineterminator = "\n"
+    quoting = csv.QUOTE_MINIMAL
+
+
+class ResultsSink:
+    """The single writer of the results files of a run.
+
+    Results may be put into the sink from any thread, in any order.
+    They are queued and handled by a thread of the sink, which buffers
+    the rows and handles them in batches. Each batch is written to the
+    results store and its rows are held in the run manifest, if there
+    are either. The rows are then written to the results files in the
+    order that a serial run writes them, each one once the rows before
+    it are written, so the files do not depend on the order that the
+    results came in. Written rows are recorded in the manifest.
+
+    How hard the rows are pushed to disk before they are recorded is
+    set by the durability policy:
+        "fsync": the rows survive a crash of the host.
+        "flush": the rows survive a crash of the program only.
+    Rows that had not been recorded when a run stopped are run again
+    when it is resumed, and held rows are written once their turn
+    comes.
+    """
+
+    DURABILITY = ("fsync", "flush")
+
+    def __init__(self, result_files, headings, order, manifest=None,
+                 store=None, debug_file=None, batch_rows=300,
+                 flush_seconds=30.0, durability="fsync"):
+        """Initialise.
+
+        :param result_files: Dict of the results file of each
+        classifier by classifier name.
+        :param headings: List of the column headings of the files.
+        :param order: SerialOrder of the rows of each results file.
+        :param manifest: RunManifest to record the written rows in,
+        None to not record them.
+        :param store: ResultsStore to also write the rows to, None to
+        only write the results files. It is opened and closed by the
+        sink.
+        :param debug_file: Name of the file to log each write to, None
+        to not log them.
+        :param batch_rows: The number of rows to buffer before writing
+        them out.
+        :param flush_seconds: The longest time to hold a row in the
+        buffer for, in seconds.
+        :param durability: Durability policy, one of DURABILITY.
+        """
+        if durability not in self.DURABILITY:
+            raise ValueError("Unknown results durability: {0}".format(
+                durability))
+        self._result_files = result_files
+        self._headings = headings
+        self._order = order
+        self._manifest = manifest
+        self._store = store
+        self._debug_file = debug_file
+        self._batch_rows = max(batch_rows, 1)
+        self._flush_seconds = flush_seconds
+        self._durability = durability
+        self._queue = Queue.Queue()
+        self._thread = None
+        self._error = None  # Exception that stopped the thread
+        self._files = {}  # Open results files by file name
+        self._f_debug = None
+        self._buffer = {}  # Rows waiting to be written by file name
+        self._num_buffered = 0
+        self._oldest = None  # Time the oldest buffered row was put
+        # Rows waiting for their turn by file name, then by position
+        self._held = {}
+        self._next = {}  # Position of the next row of each file
+
+    def open(self):
+        """Open the results files, creating those that do not exist,
+        and start writing.
+        """
+        header = format_row(self._headings)
+        try:
+            for result_file in sorted(set(self._result_files.values())):
+                if os.path.isfile(result_file):
+                    with open(result_file, mode="rb") as f_results:
+                        first_line = f_results.readline()
+                    if first_line != header:
+                        raise ValueError(
+                            "Results file {0} was written with different "
+                            "columns or in an older format. Move it aside "
+                            "to start a new one.".format(result_file))
+                else:
+                    print("Creating file: {0}".format(result_file))
+                    with open(result_file, mode="wb") as f_results:
+                        f_results.write(header)
+                self._files[result_file] = open(result_file, mode="ab")
+            if self._debug_file is not None:
+                self._f_debug = open(self._debug_file, mode="a")
+            if self._store is not None:
+                self._store.open()
+        except (IOError, ValueError):
+            self._close_files()
+            raise
+        self._thread = threading.Thread(target=self._write_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def set_manifest(self, manifest):
+        """Set the run manifest to record the written rows in.
+
+        The manifest can only be opened once the results files exist,
+        so it is usually set after open(), and before any results are
+        put. Rows held by an interrupted run are taken back from it.
+
+        :param manifest: Open RunManifest object.
+        """
+        self._manifest = manifest
+        for result_file in set(self._result_files.values()):
+            positions = set([self._order.get_position(*unit[1:]) for unit
+                             in manifest.get_written(result_file)])
+            position = 0
+            while position in positions:
+                position += 1
+            self._next[result_file] = position
+        for result_file, row in manifest.get_held_rows():
+            self._held.setdefault(result_file, {})[
+                self._order.get_position(row[1], row[3], row[4])] = row
+
+    def put(self, cls_name, features, seed, trial_num, results):
+        """Queue results of a trial to be written. If writing has
+        failed, the error that stopped it is raised instead.
+
+        :param cls_name: Name of the classifier that produced the
+        results.
+        :param features: Name of the feature set.
+        :param seed: Seed used to shuffle the folds of the trial.
+        :param trial_num: Number of the trial.
+        :param results: Results of the folds of the trial that have
+        been run.
+        """
+        self._check()
+        self._queue.put((cls_name, features, seed, trial_num, results))
+
+    def close(self):
+        """Write out the buffered rows and close the files. If writing
+        failed, the error that stopped it is raised.
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._close_files()
+        self._check()
+
+    def _check(self):
+        """Raise the error that stopped the writer thread, if any.
+        """
+        if self._error is not None:
+            raise self._error
+
+    def _write_loop(self):
+        """Write the queued results until the sink is closed.
+        """
+        try:
+            while True:
+                timeout = None
+                if self._oldest is not None:
+                    timeout = max(self._oldest + self._flush_seconds -
+                                  time.time(), 0.0)
+                try:
+                    item = self._queue.get(True, timeout)
+                except Queue.Empty:
+                    self._write_buffer()
+                    continue
+                if item is None:
+                    self._write_buffer()
+                    return
+                self._buffer_results(*item)
+                if self._num_buffered >= self._batch_rows:
+                    self._write_buffer()
+        except Exception as err:
+            # Whatever stopped the thread is raised by the next put() or
+            # by close(), so that the run does not carry on as if its
+            # results were written.
+            self._error = err
+            message = "Error writing results to file:\n{0}".format(
+                traceback.format_exc())
+            print(message)
+            try:
+                self._log(message)
+            except (IOError, OSError):
+                pass
+
+    def _buffer_results(self, cls_name, features, seed, trial_num,
+                        results):
+        """Add the rows of a trial to the buffer.
+
+        :param cls_name: Name of the classifier that produced the
+        results.
+        :param features: Name of the feature set.
+        :param seed: Seed used to shuffle the folds of the trial.
+        :param trial_num: Number of the trial.
+        :param results: Results of each fold of the trial.
+        """
+        result_file = self._result_files[cls_name]
+        rows = self._buffer.setdefault(result_file, [])
+        for r in results:
+            rows.append([cls_name, features, seed, trial_num] + list(r))
+        self._num_buffered += len(results)
+        if self._oldest is None:
+            self._oldest = time.time()
+
+    def _write_buffer(self):
+        """Write the buffered rows to their files and the results store
+        and record them in the run manifest.
+        """
+        with tracing.span("write_results", rows=self._num_buffered):
+            self._write_rows()
+        self._buffer = {}
+        self._num_buffered = 0
+        self._oldest = None
+
+    def _write_rows(self):
+        """Store the rows in the buffer, hold them in the manifest and
+        write out those whose turn has come.
+        """
+        if self._store is not None and self._buffer:
+            self._store.insert([row for result_file in sorted(self._buffer)
+                                for row in self._buffer[result_file]])
+        for result_file in sorted(self._buffer):
+            rows = self._buffer[result_file]
+            if self._manifest is not None:
+                self._manifest.hold(result_file, rows)
+            held = self._held.setdefault(result_file, {})
+            for row in rows:
+                held[self._order.get_position(row[1], row[3], row[4])] = row
+        ready = {}
+        for result_file in self._held:
+            held = self._held[result_file]
+            position = self._next.get(result_file, 0)
+            rows = []
+            while position in held:
+                rows.append(held.pop(position))
+                position += 1
+            self._next[result_file] = position
+            if rows:
+                ready[result_file] = rows
+        result_files = sorted(ready)
+        offsets = {}
+        for result_file in result_files:
+            rows = ready[result_file]
+            f_results = self._files[result_file]
+            csv.writer(f_results, ResultsDialect).writerows(rows)
+            f_results.flush()
+            if self._durability == "fsync":
+                os.fsync(f_results.fileno())
+            offsets[result_file] = f_results.tell()
+            self._log("Writing test results to file: {0}\trows: "
+                      "{1}".format(result_file, len(rows)))
+        if self._manifest is not None:
+            for result_file in result_files:
+                # Units are recorded without the results of their folds.
+                self._manifest.record(result_file, offsets[result_file],
+                                      [row[:5] for row in
+                                       ready[result_file]])
+
+    def _log(self, message):
+        """Write a message to the debug log, if there is one.
+
+        :param message: Message to write.
+        """
+        if self._f_debug is not None:
+            self._f_debug.write("{0}\t\t{1}\n".format(
+                datetime.datetime.now(), message))
+            self._f_debug.flush()
+
+    def _close_files(self):
+        """Close the results files, the results store and the debug
+        log.
+        """
+        for f_results in self._files.values():
+            f_results.close()
+        self._files = {}
+        if self._f_debug is not None:
+            self._f_debug.close()
+            self._f_debug = None
+        if self._store is not None:
+            self._store.close()
+
+
+def format_row(values):
+    """Format a row of a results file.
+
+    :param values: List of the values in the row.
+    :return: The row as a line of CSV.
+    """
+    line = StringIO()
+    csv.writer(line, ResultsDialect).writerow(values)
+    return line.getvalue()
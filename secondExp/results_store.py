@@ -0,0 +1,274 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Keep the results of runs in an SQLite database so that they can be
+queried without parsing the results files.
+"""
+
+import sqlite3
+
+__author__ = "Jarrod N. Bakker"
+
+
+class ResultsStore:
+    """An SQLite table of fold results with the same columns as the
+    results files.
+
+    Rows are keyed by the classifier, feature set, seed, trial number
+    and fold number. A row that is written again, as happens when an
+    interrupted run is resumed, replaces the one already stored.
+
+    Triggers keep the count, mean and sum of squared deviations from
+    the mean of every result column for each classifier and feature set
+    in a summary table, updated with Welford's method so that the
+    variance of results close to each other does not cancel away. The
+    mean and standard deviation of a group are worked out from it
+    without reading the rows of the group, however many there are.
+    """
+
+    TABLE = "results"
+    SUMMARY_TABLE = "results_summary"
+    KEY_COLUMNS = ("classifier", "features", "seed", "trial_num",
+                   "fold_num")
+    _COLUMN_TYPES = {"classifier": "TEXT", "features": "TEXT",
+                     "TP_rate": "REAL", "FP_rate": "REAL",
+                     "fit_time": "REAL", "predict_time": "REAL",
+                     "flows_per_sec": "REAL", "cpu_time": "REAL",
+                     "train_bytes_per_flow": "REAL",
+                     "test_bytes_per_flow": "REAL"}
+
+    def __init__(self, file_name, columns=None, durability="fsync"):
+        """Initialise.
+
+        :param file_name: Name of the database file.
+        :param columns: List of the column names, None to use those of
+        an existing database.
+        :param durability: "fsync" to sync every write to disk, "flush"
+        to leave it to the operating system.
+        """
+        self._file_name = file_name
+        self._columns = columns
+        self._durability = durability
+        self._conn = None
+
+    def open(self):
+        """Open the database, creating the table if it does not exist.
+        """
+        # The connection is used by the writer thread of a ResultsSink.
+        self._conn = sqlite3.connect(self._file_name,
+                                     check_same_thread=False)
+        try:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # Rows replaced by INSERT OR REPLACE must fire the delete
+            # trigger so that they are taken out of the summary.
+            self._conn.execute("PRAGMA recursive_triggers=ON")
+            if self._durability == "fsync":
+                self._conn.execute("PRAGMA synchronous=FULL")
+            else:
+                self._conn.execute("PRAGMA synchronous=OFF")
+            existing = self.get_columns()
+            if self._columns is None:
+                self._columns = existing
+            elif not existing:
+                self._create_table()
+            elif existing != list(self._columns):
+                raise ValueError("Results store {0} has different columns: "
+                                 "{1}".format(self._file_name,
+                                              ", ".join(existing)))
+            if self._columns and not self._has_summary():
+                # Stores made before the summary kept the mean and sum
+                # of squared deviations have theirs rebuilt.
+                self._create_summary()
+        except sqlite3.Error as err:
+            self.close()
+            raise IOError("Unable to open results store {0}: {1}".format(
+                self._file_name, err))
+        except ValueError:
+            self.close()
+            raise
+
+    def get_columns(self):
+        """Return the columns of the results table.
+
+        :return: List of the column names, empty if there is no table.
+        """
+        info = self._conn.execute("PRAGMA table_info({0})".format(
+            self.TABLE)).fetchall()
+        return [str(col[1]) for col in info]
+
+    def insert(self, rows):
+        """Write rows to the store.
+
+        :param rows: List of rows, each a list of values in column
+        order.
+        """
+        sql = "INSERT OR REPLACE INTO {0} VALUES ({1})".format(
+            self.TABLE, ", ".join(["?"] * len(self._columns)))
+        try:
+            with self._conn:
+                self._conn.executemany(sql, rows)
+        except sqlite3.Error as err:
+            raise IOError("Unable to write to results store {0}: "
+                          "{1}".format(self._file_name, err))
+
+    def aggregate(self, metrics, classifier=None, features=None):
+        """Return the count, mean and sample variance of metrics for
+        each classifier and feature set.
+
+        :param metrics: List of the names of the columns to aggregate.
+        :param classifier: Name of a classifier to limit the rows to,
+        None for all of them.
+        :param features: Name of a feature set to limit the rows to,
+        None for all of them.
+        :return: List of tuples of the classifier, the feature set, the
+        number of rows and a list of the mean and sample variance of
+        each metric. The variance is 0 for a single row.
+        """
+        for metric in metrics:
+            if metric not in self._get_value_columns():
+                raise ValueError("Unknown result column: {0}".format(
+                    metric))
+        selects = []
+        for metric in metrics:
+            selects.append("mean_{0}, CASE WHEN n > 1 THEN m2_{0}/(n-1) "
+                           "ELSE 0.0 END".format(metric))
+        where = []
+        params = []
+        if classifier is not None:
+            where.append("classifier = ?")
+            params.append(classifier)
+        if features is not None:
+            where.append("features = ?")
+            params.append(features)
+        where.append("n > 0")
+        sql = "SELECT classifier, features, n, {0} FROM {1} WHERE {2} " \
+              "ORDER BY classifier, features".format(
+               ", ".join(selects), self.SUMMARY_TABLE, " AND ".join(where))
+        groups = []
+        for row in self._conn.execute(sql, params):
+            moments = [(row[i], row[i+1]) for i in range(3, len(row), 2)]
+            groups.append((row[0], row[1], row[2], moments))
+        return groups
+
+    def close(self):
+        """Close the database.
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _get_value_columns(self):
+        """Return the columns that hold results rather than identify a
+        fold.
+
+        :return: List of the column names.
+        """
+        return [c for c in self._columns if c not in self.KEY_COLUMNS]
+
+    def _has_summary(self):
+        """Check that the summary table keeps the mean and sum of
+        squared deviations of every result column.
+
+        :return: True if it does, False otherwise.
+        """
+        info = self._conn.execute("PRAGMA table_info({0})".format(
+            self.SUMMARY_TABLE)).fetchall()
+        summary_columns = set([str(col[1]) for col in info])
+        for column in self._get_value_columns():
+            if "m2_{0}".format(column) not in summary_columns:
+                return False
+        return True
+
+    def _create_table(self):
+        """Create the results table and its summary table.
+        """
+        definitions = []
+        for column in self._columns:
+            definitions.append("{0} {1}".format(
+                column, self._COLUMN_TYPES.get(column, "INTEGER")))
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE {0} ({1}, PRIMARY KEY ({2})) WITHOUT "
+                "ROWID".format(self.TABLE, ", ".join(definitions),
+                               ", ".join(self.KEY_COLUMNS)))
+        self._create_summary()
+
+    def _create_summary(self):
+        """Create the summary table from the rows already stored, and
+        the triggers that keep it up to date, replacing any that exist.
+        """
+        values = self._get_value_columns()
+        moments = []
+        for column in values:
+            moments.append("mean_{0} REAL NOT NULL DEFAULT 0, m2_{0} REAL "
+                           "NOT NULL DEFAULT 0".format(column))
+        # The summary row of a group is created without a conflict
+        # clause, as the OR REPLACE of the insert that fired the trigger
+        # would override it.
+        add_group = "INSERT INTO {0} (classifier, features) SELECT " \
+                    "NEW.classifier, NEW.features WHERE NOT EXISTS " \
+                    "(SELECT 1 FROM {0} WHERE classifier = NEW.classifier " \
+                    "AND features = NEW.features);".format(
+                     self.SUMMARY_TABLE)
+        # The right hand sides of an UPDATE see the values from before
+        # it, so each step of Welford's method is written in terms of
+        # the old count and mean. Taking the last row out of a group
+        # resets it, and rounding is kept from leaving a negative sum.
+        adds = ["n = n + 1"]
+        removes = ["n = n - 1"]
+        for column in values:
+            adds.append("mean_{0} = mean_{0} + (NEW.{0} - mean_{0})/(n + "
+                        "1.0), m2_{0} = m2_{0} + (NEW.{0} - mean_{0})*"
+                        "(NEW.{0} - mean_{0})*n/(n + 1.0)".format(column))
+            removes.append("mean_{0} = CASE WHEN n > 1 THEN mean_{0} - "
+                           "(OLD.{0} - mean_{0})/(n - 1.0) ELSE 0.0 END, "
+                           "m2_{0} = CASE WHEN n > 1 THEN MAX(m2_{0} - "
+                           "(OLD.{0} - mean_{0})*(OLD.{0} - mean_{0})*n/"
+                           "(n - 1.0), 0.0) ELSE 0.0 END".format(column))
+        updates = {}
+        for row, changes in (("NEW", adds), ("OLD", removes)):
+            updates[row] = "UPDATE {0} SET {1} WHERE classifier = " \
+                           "{2}.classifier AND features = {2}.features;" \
+                           "".format(self.SUMMARY_TABLE, ", ".join(changes),
+                                     row)
+        # The rows already stored are summarised in two passes, the
+        # means first and then the squared deviations from them.
+        means = ", ".join(["AVG({0}) AS {0}".format(column) for column in
+                           values])
+        sums = ", ".join(["g.{0}, SUM((r.{0} - g.{0})*(r.{0} - g.{0}))"
+                          "".format(column) for column in values])
+        with self._conn:
+            for kind in ("insert", "delete"):
+                self._conn.execute("DROP TRIGGER IF EXISTS {0}_{1}".format(
+                    self.TABLE, kind))
+            self._conn.execute("DROP TABLE IF EXISTS {0}".format(
+                self.SUMMARY_TABLE))
+            self._conn.execute(
+                "CREATE TABLE {0} (classifier TEXT, features TEXT, n "
+                "INTEGER NOT NULL DEFAULT 0, {1}, PRIMARY KEY (classifier, "
+                "features))".format(self.SUMMARY_TABLE, ", ".join(moments)))
+            self._conn.execute(
+                "INSERT INTO {0} SELECT r.classifier, r.features, COUNT(*), "
+                "{1} FROM {2} AS r JOIN (SELECT classifier, features, {3} "
+                "FROM {2} GROUP BY classifier, features) AS g ON "
+                "r.classifier = g.classifier AND r.features = g.features "
+                "GROUP BY r.classifier, r.features".format(
+                 self.SUMMARY_TABLE, sums, self.TABLE, means))
+            self._conn.execute(
+                "CREATE TRIGGER {0}_insert AFTER INSERT ON {0} BEGIN {1} "
+                "{2} END".format(self.TABLE, add_group, updates["NEW"]))
+            self._conn.execute(
+                "CREATE TRIGGER {0}_delete AFTER DELETE ON {0} BEGIN {1} "
+                "END".format(self.TABLE, updates["OLD"]))
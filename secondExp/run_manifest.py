@@ -0,0 +1,217 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Keep track of the tests of a run that are done so that an
+interrupted run can be resumed.
+"""
+
+import json
+import os
+
+__author__ = "Jarrod N. Bakker"
+
+
+class RunManifest:
+    """A record of the completed units of a run, where a unit is one
+    fold of one trial of a classifier on a feature set.
+
+    The manifest is a file of JSON lines. The first line describes the
+    run and the size of each results file when the run started. Later
+    lines either hold the rows of units that are done but wait for
+    earlier units before they can be written to their results file, or
+    record a block of units along with the size of the results file
+    once their rows were written to it. Each line is flushed to disk
+    before the next one is written, so a line is either recorded in
+    full or is ignored when the manifest is read back.
+
+    When a run is resumed, each results file is truncated back to the
+    size recorded with its last block. Units whose rows are held in the
+    manifest are not run again, and their rows are handed back to be
+    written. Other units written after the last block are dropped and
+    run again, so no rows are duplicated. The manifest is removed once
+    the run has finished.
+    """
+
+    def __init__(self, file_name):
+        """Initialise.
+
+        :param file_name: Name of the manifest file.
+        """
+        self._file_name = file_name
+        self._completed = set()
+        self._written = {}  # Units written by results file name
+        self._held = []  # Held rows that are not written yet
+
+    def open(self, run_info, result_files):
+        """Open the manifest of a run, resuming it if the manifest of
+        an interrupted run of the same experiment is found.
+
+        :param run_info: Dict describing the run. A manifest is only
+        resumed if it was written for the same description.
+        :param result_files: List of the names of the results files.
+        :return: Set of the completed units as tuples of the classifier
+        name, feature set name, trial number and fold number.
+        """
+        self._completed = set()
+        self._written = {}
+        self._held = []
+        records = self._read()
+        if records and records[0].get("run") == run_info:
+            self._resume(records)
+        else:
+            if records:
+                print("Ignoring the manifest of a different run: "
+                      "{0}".format(self._file_name))
+            sizes = {}
+            for result_file in result_files:
+                sizes[result_file] = os.path.getsize(result_file)
+            with open(self._file_name, mode="w") as f_manifest:
+                self._append(f_manifest, {"run": run_info,
+                                          "sizes": sizes})
+        return set(self._completed)
+
+    def hold(self, result_file, rows):
+        """Record the rows of completed units that are not written to
+        their results file yet.
+
+        :param result_file: Name of the results file the rows belong
+        to.
+        :param rows: List of the rows, each starting with the classifier
+        name, feature set name, seed, trial number and fold number.
+        """
+        with open(self._file_name, mode="a") as f_manifest:
+            self._append(f_manifest, {"file": result_file, "held": rows})
+        for row in rows:
+            self._completed.add((row[0], row[1], row[3], row[4]))
+
+    def get_held_rows(self):
+        """Return the rows held by an interrupted run that were not
+        written to their results files.
+
+        :return: List of tuples of the results file name and the row.
+        """
+        return list(self._held)
+
+    def get_written(self, result_file):
+        """Return the units of this run written to a results file.
+
+        :param result_file: Name of the results file.
+        :return: Set of the units as tuples of the classifier name,
+        feature set name, trial number and fold number.
+        """
+        return set(self._written.get(result_file, ()))
+
+    def record(self, result_file, offset, units):
+        """Record a block of completed units.
+
+        :param result_file: Name of the results file the rows of the
+        units were written to.
+        :param offset: Size of the results file after the rows were
+        written.
+        :param units: List of the units as lists of the classifier name,
+        feature set name, seed, trial number and fold number.
+        """
+        with open(self._file_name, mode="a") as f_manifest:
+            self._append(f_manifest, {"file": result_file,
+                                      "offset": offset, "units": units})
+        written = self._written.setdefault(result_file, set())
+        for cls_name, features, seed, trial_num, fold_num in units:
+            self._completed.add((cls_name, features, trial_num,
+                                 fold_num))
+            written.add((cls_name, features, trial_num, fold_num))
+
+    def remove(self):
+        """Remove the manifest once the run has finished.
+        """
+        if os.path.isfile(self._file_name):
+            os.remove(self._file_name)
+
+    def _resume(self, records):
+        """Restore the completed units of an interrupted run and
+        truncate the results files to match them.
+
+        :param records: List of the records in the manifest.
+        """
+        offsets = dict(records[0]["sizes"])
+        kept = [records[0]]
+        held = []
+        for rec in records[1:]:
+            result_file = rec["file"]
+            if "held" in rec:
+                kept.append(rec)
+                for row in rec["held"]:
+                    held.append((result_file, row))
+                    self._completed.add((row[0], row[1], row[3], row[4]))
+                continue
+            # A block can only be trusted if all of its rows made it
+            # into the results file.
+            if not os.path.isfile(result_file) or \
+                    os.path.getsize(result_file) < rec["offset"]:
+                continue
+            offsets[result_file] = max(offsets.get(result_file, 0),
+                                       rec["offset"])
+            kept.append(rec)
+            written = self._written.setdefault(result_file, set())
+            for cls_name, features, seed, trial_num, fold_num in \
+                    rec["units"]:
+                self._completed.add((cls_name, features, trial_num,
+                                     fold_num))
+                written.add((cls_name, features, trial_num, fold_num))
+        for result_file, row in held:
+            if (row[0], row[1], row[3], row[4]) not in \
+                    self._written.get(result_file, ()):
+                self._held.append((result_file, row))
+        for result_file in offsets:
+            if os.path.isfile(result_file) and \
+                    os.path.getsize(result_file) > offsets[result_file]:
+                with open(result_file, mode="r+") as f_results:
+                    f_results.truncate(offsets[result_file])
+        # Rewrite the manifest without any partly written line so that
+        # new records can be appended to it.
+        tmp_file_name = self._file_name + ".tmp"
+        with open(tmp_file_name, mode="w") as f_manifest:
+            for rec in kept:
+                self._append(f_manifest, rec)
+        os.rename(tmp_file_name, self._file_name)
+        print("Resuming run from {0}: {1} units already done.".format(
+            self._file_name, len(self._completed)))
+
+    def _read(self):
+        """Read the records of the manifest.
+
+        :return: List of the records as dicts, empty if there is no
+        manifest.
+        """
+        records = []
+        if not os.path.isfile(self._file_name):
+            return records
+        with open(self._file_name, mode="r") as f_manifest:
+            for line in f_manifest:
+                if not line.endswith("\n"):
+                    break  # The run stopped part way through the line
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+
+    def _append(self, f_manifest, record):
+        """Write a record to the manifest and flush it to disk.
+
+        :param f_manifest: Manifest file opened for writing.
+        :param record: Dict to write.
+        """
+        f_manifest.write(json.dumps(record, sort_keys=True) + "\n")
+        f_manifest.flush()
+        os.fsync(f_manifest.fileno())
@@ -0,0 +1,128 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Estimate how long the tasks of an experiment take so that they can
+be ordered to finish as early as possible.
+"""
+
+import heapq
+import json
+import os
+
+__author__ = "Jarrod N. Bakker"
+
+
+class TaskCosts:
+    """The cost, in seconds, of running a classifier on one fold of a
+    feature set.
+
+    Costs are kept between runs in a JSON file. The cost of each
+    classifier and feature set pair is the mean time of its folds in
+    the last run that measured it.
+    """
+
+    def __init__(self, file_name=None):
+        """Initialise.
+
+        :param file_name: Name of the JSON file to keep the costs in,
+        None to not keep them between runs.
+        """
+        self._file_name = file_name
+        self._costs = {}  # Classifier name to dict of feature set costs
+        self._measured = {}  # (classifier, feature set) to list of times
+        if file_name is not None and os.path.isfile(file_name):
+            try:
+                with open(file_name, mode="r") as f_costs:
+                    self._costs = json.load(f_costs)
+            except (IOError, ValueError) as err:
+                print("Ignoring task costs in {0}: {1}".format(file_name,
+                                                               err))
+
+    def get(self, cls_name, features):
+        """Return the cost of a classifier on a fold of a feature set.
+
+        :param cls_name: Name of the classifier.
+        :param features: Name of the feature set.
+        :return: Cost in seconds, or None if it is not known.
+        """
+        return self._costs.get(cls_name, {}).get(features)
+
+    def predict(self, task):
+        """Return the cost of a task.
+
+        :param task: ExperimentTask to cost.
+        :return: Cost in seconds, or None if any part of it is not
+        known.
+        """
+        total = 0.0
+        for name in task.classifiers:
+            cost = self.get(name, task.features)
+            if cost is None:
+                return None
+            total += cost
+        return total
+
+    def record(self, cls_name, features, seconds):
+        """Record the time a classifier took on a fold of a feature set.
+
+        The cost used by get() is updated straight away.
+
+        :param cls_name: Name of the classifier.
+        :param features: Name of the feature set.
+        :param seconds: Time taken in seconds.
+        """
+        times = self._measured.setdefault((cls_name, features), [])
+        times.append(seconds)
+        self._costs.setdefault(cls_name, {})[features] = \
+            sum(times) / len(times)
+
+    def save(self):
+        """Save the costs for later runs.
+        """
+        if self._file_name is None or not self._measured:
+            return
+        try:
+            tmp_file_name = self._file_name + ".tmp"
+            with open(tmp_file_name, mode="w") as f_costs:
+                json.dump(self._costs, f_costs, indent=2, sort_keys=True)
+            os.rename(tmp_file_name, self._file_name)
+        except (IOError, OSError) as err:
+            print("Unable to save task costs to {0}: {1}".format(
+                self._file_name, err))
+
+
+def longest_first(costs):
+    """Order tasks from the most to the least costly.
+
+    Tasks of equal cost keep their original order.
+
+    :param costs: List of the cost of each task.
+    :return: List of task indices in the order to start them.
+    """
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def makespan(costs, workers):
+    """Return how long a list of tasks takes when each task is started
+    on the first worker to become free.
+
+    :param costs: List of the cost of each task, in the order that they
+    are started.
+    :param workers: Number of workers.
+    :return: Time until the last task finishes, in seconds.
+    """
+    loads = [0.0] * max(1, min(workers, len(costs)))
+    for cost in costs:
+        heapq.heapreplace(loads, loads[0]+cost)
+    return max(loads)
@@ -0,0 +1,77 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Tests of the results sink.
+
+Usage: python -m unittest test_results_sink
+"""
+
+from experiment_scheduler import SerialOrder
+from results_sink import ResultsSink
+
+import os
+import shutil
+import tempfile
+import unittest
+
+__author__ = "Jarrod N. Bakker"
+
+
+class _FailingStore:
+    """A results store that cannot take rows.
+    """
+
+    def open(self):
+        pass
+
+    def insert(self, rows):
+        raise ValueError("Bad row")
+
+    def close(self):
+        pass
+
+
+class ResultsSinkTest(unittest.TestCase):
+    """Tests of ResultsSink.
+    """
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._result_file = os.path.join(self._dir, "results.csv")
+        self._sink = ResultsSink({"A": self._result_file},
+                                 ["classifier", "features", "seed",
+                                  "trial_num", "fold_num", "TP"],
+                                 SerialOrder(["fs"], 1, 2),
+                                 store=_FailingStore(), batch_rows=1,
+                                 flush_seconds=0.0, durability="flush")
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_write_error_is_raised(self):
+        """An error other than an IOError that stops the writer is
+        raised by put() and by close().
+        """
+        self._sink.open()
+        self._sink.put("A", "fs", 1, 1, [[1, 5]])
+        self._sink._thread.join(5.0)
+        self.assertFalse(self._sink._thread.is_alive())
+        self.assertRaises(ValueError, self._sink.put, "A", "fs", 1, 1,
+                          [[2, 6]])
+        self.assertRaises(ValueError, self._sink.close)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,507 @@
+# Copyright 2016 Jarrod N. Bakker
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Trace where the time and memory of a run go.
+
+Phases of a run are wrapped in nested spans. When tracing is enabled
+each span is written as a line of JSON once it ends, and the lines can
+be turned into a Chrome trace file to view the run in a trace viewer
+such as chrome://tracing or Perfetto. When tracing is not enabled a
+span does nothing.
+
+Spans can also record memory: the resident set size (RSS) when the span
+started and ended and its peak while the span was open, read from
+/proc/self/status. The peak RSS of the process is never reset. If it
+rose while a span was open it is the peak of the span, otherwise the
+peak of the span is taken from the RSS sampled by a thread of the
+tracer while the span was open.
+
+Usage: python tracing.py TRACE_JSONL CHROME_TRACE_JSON [MEMORY_CSV]
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+__author__ = "Jarrod N. Bakker"
+
+
+class Tracer:
+    """Writes the spans of a process to a JSON lines file.
+
+    The file is opened for appending and each span is written with a
+    single write, so several processes can trace to the same file.
+
+    Memory is only recorded for the spans of the thread that created
+    the tracer, or of the main thread of a forked process, as the RSS
+    is shared by every thread of a process.
+    """
+
+    # How often the RSS is sampled while memory is recorded, in seconds.
+    _SAMPLE_INTERVAL = 0.01
+
+    def __init__(self, file_name, truncate=False, memory=False):
+        """Initialise.
+
+        :param file_name: Name of the JSON lines file, None to not write
+        the spans out.
+        :param truncate: True to empty the file first.
+        :param memory: True to record the memory of each span.
+        """
+        self._file_name = file_name
+        self._fd = None
+        if file_name is not None:
+            flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT
+            if truncate:
+                flags |= os.O_TRUNC
+            self._fd = os.open(file_name, flags, 0o644)
+        self._memory = memory
+        self._pid = os.getpid()
+        self._memory_thread = threading.current_thread().ident
+        self._local = threading.local()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._memory_spans = []  # Open spans that record memory
+        self._stop_sampling = None
+        self._sampler = None
+        if memory:
+            self._start_sampling()
+
+    def get_file_name(self):
+        """Return the name of the file the spans are written to.
+
+        :return: File name as a string.
+        """
+        return self._file_name
+
+    def is_tracing_memory(self):
+        """Return whether the memory of each span is recorded.
+
+        :return: True if it is, False otherwise.
+        """
+        return self._memory
+
+    def span(self, name, **args):
+        """Return a span to time a phase with.
+
+        :param name: Name of the phase.
+        :param args: Values to record with the span.
+        :return: Span object to use as a context manager.
+        """
+        return _Span(self, name, args)
+
+    def close(self):
+        """Stop sampling the RSS and close the file.
+        """
+        if self._stop_sampling is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._stop_sampling = None
+            self._sampler = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _stack(self):
+        """Return the open spans of the calling thread.
+
+        :return: List of dicts of the open spans, innermost last.
+        """
+        if os.getpid() != self._pid:
+            # Spans that were open when this process was forked belong
+            # to the parent process.
+            self._pid = os.getpid()
+            self._memory_thread = threading.current_thread().ident
+            self._local = threading.local()
+            # Only the forking thread is carried over by fork(), so the
+            # lock may have been copied while another thread, such as
+            # the sampling thread, held it. It is replaced rather than
+            # used, and so is the sampling thread.
+            self._lock = threading.Lock()
+            self._memory_spans = []
+            if self._memory:
+                self._start_sampling()
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _begin(self):
+        """Open a span in the calling thread.
+
+        :return: Dict of the span ID, the ID of its parent (None if it
+        has no parent) and, if memory is recorded, its memory so far.
+        """
+        stack = self._stack()
+        with self._lock:
+            self._next_id += 1
+            span_id = "{0}-{1}".format(self._pid, self._next_id)
+        parent = stack[-1] if stack else None
+        entry = {"id": span_id, "parent": None}
+        if parent is not None:
+            entry["parent"] = parent["id"]
+        if self._memory and \
+                threading.current_thread().ident == self._memory_thread:
+            rss, process_peak = _read_rss()
+            entry.update({"rss_start": rss, "rss_peak": rss,
+                          "process_peak": process_peak})
+            with self._lock:
+                self._memory_spans.append(entry)
+        stack.append(entry)
+        return entry
+
+    def _end(self, entry, name, args, start, end):
+        """Close a span and write it out.
+
+        :param entry: Dict returned by _begin() for the span.
+        :param name: Name of the span.
+        :param args: Dict of the values recorded with the span.
+        :param start: Time the span started in seconds.
+        :param end: Time the span ended in seconds.
+        :return: Dict of the memory of the span, None if it was not
+        recorded.
+        """
+        stack = self._stack()
+        if stack and stack[-1] is entry:
+            stack.pop()
+        record = {"id": entry["id"], "parent": entry["parent"],
+                  "name": name, "ts": int(start*1e6),
+                  "dur": int((end-start)*1e6), "pid": self._pid,
+                  "tid": threading.current_thread().ident,
+                  "depth": len(stack), "args": args}
+        memory = None
+        if "rss_peak" in entry:
+            rss, process_peak = _read_rss()
+            with self._lock:
+                if entry in self._memory_spans:
+                    self._memory_spans.remove(entry)
+                rss_peak = max(entry["rss_peak"], rss)
+            if process_peak > entry["process_peak"]:
+                # The process reached a new peak while the span was
+                # open, so that is the peak of the span.
+                rss_peak = process_peak
+            memory = {"rss_start": entry["rss_start"], "rss_end": rss,
+                      "rss_peak": rss_peak}
+            if stack and "rss_peak" in stack[-1]:
+                with self._lock:
+                    stack[-1]["rss_peak"] = max(stack[-1]["rss_peak"],
+                                                rss_peak)
+            record["memory"] = memory
+        if self._fd is not None:
+            os.write(self._fd, json.dumps(record, sort_keys=True) + "\n")
+        return memory
+
+    def _start_sampling(self):
+        """Start a thread that samples the RSS of this process into the
+        peaks of the open spans.
+        """
+        self._stop_sampling = threading.Event()
+        self._sampler = threading.Thread(target=self._sample,
+                                         args=(self._stop_sampling,))
+        self._sampler.daemon = True
+        self._sampler.start()
+
+    def _sample(self, stop):
+        """Sample the RSS until told to stop.
+
+        :param stop: Event that is set once sampling should stop.
+        """
+        while not stop.wait(self._SAMPLE_INTERVAL):
+            rss = _read_rss()[0]
+            with self._lock:
+                for entry in self._memory_spans:
+                    if rss > entry["rss_peak"]:
+                        entry["rss_peak"] = rss
+
+
+class _Span:
+    """A phase timed by a Tracer.
+    """
+
+    def __init__(self, tracer, name, args):
+        """Initialise.
+
+        :param tracer: Tracer to write the span to.
+        :param name: Name of the phase.
+        :param args: Dict of values to record with the span.
+        """
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._entry = None
+        self._start = None
+        self._memory = None
+
+    def __enter__(self):
+        self._entry = self._tracer._begin()
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        end = time.time()
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._memory = self._tracer._end(self._entry, self._name,
+                                         self._args, self._start, end)
+        return False
+
+    def set(self, **args):
+        """Record more values with the span.
+
+        :param args: Values to record. They must be serialisable as
+        JSON.
+        """
+        self._args.update(args)
+
+    def get_memory(self):
+        """Return the memory of the span once it has ended.
+
+        :return: Dict of the RSS in bytes when the span started and
+        ended and at its peak, None if memory was not recorded.
+        """
+        return self._memory
+
+
+class _NoSpan:
+    """A span that does nothing, used while tracing is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def get_memory(self):
+        return None
+
+
+_NO_SPAN = _NoSpan()
+_tracer = None
+
+
+def enable(file_name, truncate=False, memory=False):
+    """Start tracing this process.
+
+    Nothing is done if the process is already tracing in the same way.
+
+    :param file_name: Name of the JSON lines file, None to not write the
+    spans out. Tracing is disabled if this is None and memory is not
+    recorded either.
+    :param truncate: True to empty the file first.
+    :param memory: True to record the memory of each span.
+    """
+    global _tracer
+    if _tracer is not None:
+        if _tracer.get_file_name() == file_name and not truncate and \
+                _tracer.is_tracing_memory() == memory:
+            return
+        _tracer.close()
+        _tracer = None
+    if file_name is not None or memory:
+        _tracer = Tracer(file_name, truncate, memory)
+
+
+def disable():
+    """Stop tracing this process.
+    """
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+
+def get_file_name():
+    """Return the name of the file this process is tracing to.
+
+    :return: File name, or None if the spans are not written out.
+    """
+    if _tracer is None:
+        return None
+    return _tracer.get_file_name()
+
+
+def is_tracing_memory():
+    """Return whether this process records the memory of each span.
+
+    :return: True if it does, False otherwise.
+    """
+    return _tracer is not None and _tracer.is_tracing_memory()
+
+
+def span(name, **args):
+    """Return a span to time a phase with.
+
+    :param name: Name of the phase.
+    :param args: Values to record with the span. They must be
+    serialisable as JSON.
+    :return: Span object to use as a context manager.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, **args)
+
+
+def bytes_per_flow(nbytes, num_flows):
+    """Return the bytes taken by each flow in an in-memory
+    representation of the data, to record with a span.
+
+    :param nbytes: Size of the representation in bytes.
+    :param num_flows: The number of flows it holds.
+    :return: Bytes per flow as a float.
+    """
+    return nbytes / float(max(num_flows, 1))
+
+
+def read_trace(jsonl_file):
+    """Read the spans of a JSON lines trace.
+
+    :param jsonl_file: Name of the JSON lines trace.
+    :return: List of the spans as dicts.
+    """
+    records = []
+    with open(jsonl_file, mode="r") as f_trace:
+        for line in f_trace:
+            if not line.endswith("\n"):
+                break  # A process stopped part way through the line
+            records.append(json.loads(line))
+    return records
+
+
+def export_chrome_trace(jsonl_file, trace_file):
+    """Convert a JSON lines trace into a Chrome trace file.
+
+    :param jsonl_file: Name of the JSON lines trace.
+    :param trace_file: Name of the Chrome trace file to write.
+    :return: The number of spans written.
+    """
+    events = []
+    for record in read_trace(jsonl_file):
+        args = dict(record["args"])
+        if "memory" in record:
+            args.update(record["memory"])
+        events.append({"name": record["name"], "ph": "X",
+                       "ts": record["ts"], "dur": record["dur"],
+                       "pid": record["pid"], "tid": record["tid"],
+                       "args": args})
+    with open(trace_file, mode="w") as f_chrome:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"},
+                  f_chrome)
+    return len(events)
+
+
+def export_memory_report(jsonl_file, report_file):
+    """Summarise the memory of the spans of a trace as a CSV file.
+
+    Spans are grouped by their name, the feature they computed, if
+    any, and the classifier and feature set they ran under, taken from
+    the nearest enclosing span that names them. Each group gets the
+    largest peak RSS, the largest and mean growth of the RSS above
+    where the span started and the mean bytes per flow of the data held
+    by its spans.
+
+    :param jsonl_file: Name of the JSON lines trace.
+    :param report_file: Name of the CSV file to write.
+    :return: The number of groups written.
+    """
+    records = read_trace(jsonl_file)
+    by_id = dict([(r["id"], r) for r in records])
+    groups = {}
+    for record in records:
+        if "memory" not in record:
+            continue
+        key = (record["name"], record["args"].get("feature", ""),
+               _inherited_arg(record, by_id, "classifier"),
+               _inherited_arg(record, by_id, "feature_set", "features"))
+        group = groups.setdefault(key, {"count": 0, "rss_peak": 0,
+                                        "growth": [],
+                                        "bytes_per_flow": []})
+        memory = record["memory"]
+        group["count"] += 1
+        group["rss_peak"] = max(group["rss_peak"], memory["rss_peak"])
+        group["growth"].append(memory["rss_peak"]-memory["rss_start"])
+        if "bytes_per_flow" in record["args"]:
+            group["bytes_per_flow"].append(record["args"]["bytes_per_flow"])
+    with open(report_file, mode="wb") as f_report:
+        writer = csv.writer(f_report, lineterminator="\n")
+        writer.writerow(["stage", "feature", "classifier", "features",
+                         "count", "max_rss_peak", "max_rss_growth",
+                         "mean_rss_growth", "bytes_per_flow"])
+        for key in sorted(groups, key=lambda k: [str(v) for v in k]):
+            group = groups[key]
+            bytes_per_flow = ""
+            if group["bytes_per_flow"]:
+                bytes_per_flow = sum(group["bytes_per_flow"]) / \
+                    float(len(group["bytes_per_flow"]))
+            writer.writerow(list(key) + [
+                group["count"], group["rss_peak"], max(group["growth"]),
+                sum(group["growth"])/float(len(group["growth"])),
+                bytes_per_flow])
+    return len(groups)
+
+
+def _inherited_arg(record, by_id, *names):
+    """Return the value of an argument of a span or of the nearest
+    enclosing span that has it.
+
+    :param record: Span as a dict.
+    :param by_id: Dict of every span by ID.
+    :param names: Names the argument may have.
+    :return: The value, or "" if no span has it.
+    """
+    while record is not None:
+        for name in names:
+            if name in record["args"]:
+                return record["args"][name]
+        record = by_id.get(record["parent"])
+    return ""
+
+
+def _read_rss():
+    """Return the RSS of this process and its peak since it started.
+
+    :return: Tuple of the RSS and the peak RSS in bytes, zeros if they
+    cannot be read.
+    """
+    rss = 0
+    rss_peak = 0
+    try:
+        with open("/proc/self/status", mode="r") as f_status:
+            for line in f_status:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith("VmHWM:"):
+                    rss_peak = int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return rss, max(rss, rss_peak)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python tracing.py TRACE_JSONL CHROME_TRACE_JSON "
+              "[MEMORY_CSV]")
+        sys.exit(-1)
+    num_spans = export_chrome_trace(sys.argv[1], sys.argv[2])
+    print("Wrote {0} spans to: {1}".format(num_spans, sys.argv[2]))
+    if len(sys.argv) == 4:
+        num_groups = export_memory_report(sys.argv[1], sys.argv[3])
+        print("Wrote {0} memory groups to: {1}".format(num_groups,
+                                                       sys.argv[3]))